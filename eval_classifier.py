@@ -0,0 +1,130 @@
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import Optional
+
+from src.gpt_sovits_emotion_manager.config import load_config
+from src.gpt_sovits_emotion_manager.log import setup_logger, log
+from src.gpt_sovits_emotion_manager.classifier import EmotionClassifier
+from src.gpt_sovits_emotion_manager.utils import emotion_key, load_emotion_annotations
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main(file_path: Path, test_ratio: float, seed: int, config_path: Optional[str]):
+    config = load_config(config_path)
+
+    setup_logger(config)
+
+    annotations = [a for a in load_emotion_annotations(file_path) if a.emotions]
+    random.Random(seed).shuffle(annotations)
+
+    split = int(len(annotations) * (1 - test_ratio))
+    train, test = annotations[:split], annotations[split:]
+    if not train or not test:
+        log("ERROR", "Not enough emotion annotations to evaluate the classifier.")
+        return None
+
+    start = time.perf_counter()
+    classifier = EmotionClassifier.fit(
+        train,
+        ngram_range=(config.classifier.min_ngram, config.classifier.max_ngram),
+        k=config.classifier.k,
+    )
+    log(
+        "INFO",
+        f"Fitted on <c>{len(train)}</c> annotations in <c>{time.perf_counter() - start:.2f}s</c>, "
+        f"evaluating on <c>{len(test)}</c> annotations",
+    )
+
+    results = []
+    latencies = []
+    for annotation in test:
+        start = time.perf_counter()
+        emotions, share, similarity = classifier.score(annotation.text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        exact = emotion_key(emotions) == emotion_key(annotation.emotions)
+        types = {e.type for e in emotions} == {e.type for e in annotation.emotions}
+        # 与 `EmotionClassifier.predict` 的置信度一致
+        results.append((share * similarity, exact, types, share, similarity))
+
+    log(
+        "INFO",
+        f"Exact accuracy: <c>{sum(r[1] for r in results) / len(results):.2%}</c>, "
+        f"type accuracy: <c>{sum(r[2] for r in results) / len(results):.2%}</c>",
+    )
+    similarities = [r[4] for r in results]
+    log(
+        "INFO",
+        f"Mean top-k similarity: p5 <c>{percentile(similarities, 0.05):.3f}</c>, "
+        f"p50 <c>{percentile(similarities, 0.5):.3f}</c>, "
+        f"p95 <c>{percentile(similarities, 0.95):.3f}</c>, "
+        f"mean vote share <c>{sum(r[3] for r in results) / len(results):.2%}</c>",
+    )
+    log(
+        "INFO",
+        f"Latency: p50 <c>{percentile(latencies, 0.5):.2f}ms</c>, "
+        f"p95 <c>{percentile(latencies, 0.95):.2f}ms</c>, "
+        f"p99 <c>{percentile(latencies, 0.99):.2f}ms</c>",
+    )
+
+    thresholds = sorted(
+        {0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, config.classifier.threshold}
+    )
+    for threshold in thresholds:
+        covered = [r for r in results if r[0] >= threshold]
+        if not covered:
+            log("INFO", f"Threshold <y>{threshold:.2f}</y>: no prediction covered")
+            continue
+        log(
+            "INFO",
+            f"Threshold <y>{threshold:.2f}</y>: "
+            f"local <c>{len(covered) / len(results):.2%}</c>, "
+            f"LLM fallback <c>{1 - len(covered) / len(results):.2%}</c>, "
+            f"exact accuracy <c>{sum(r[1] for r in covered) / len(covered):.2%}</c>, "
+            f"type accuracy <c>{sum(r[2] for r in covered) / len(covered):.2%}</c>, "
+            f"mean similarity <c>{sum(r[4] for r in covered) / len(covered):.3f}</c>",
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate the accuracy and latency of the local emotion classifier."
+    )
+    parser.add_argument(
+        "--file-path", "-f", type=str, help="The path to the emotion annotations file."
+    )
+    parser.add_argument(
+        "--test-ratio",
+        type=float,
+        default=0.2,
+        help="The ratio of annotations held out for evaluation.",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="The seed used to split the annotations."
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=str,
+        default=None,
+        help="The path to the config file. Defaults to `config.yaml`.",
+    )
+    args = parser.parse_args()
+
+    if args.file_path is None:
+        print(
+            "Please specify the path to the emotion annotations file, e.g. `python eval_classifier.py -f /path/to/emotion_annotations.json`"
+        )
+        exit(1)
+
+    if not Path(args.file_path).exists():
+        print(f"File not found: {args.file_path}")
+        exit(1)
+
+    main(Path(args.file_path), args.test_ratio, args.seed, args.config)
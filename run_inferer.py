@@ -1,15 +1,20 @@
-import json
 import time
 import asyncio
 import argparse
 from pathlib import Path
+from typing import Dict, List, Optional
 from httpx import TimeoutException
 
 from src.gpt_sovits_emotion_manager import Inferer
 from src.gpt_sovits_emotion_manager.config import load_config
-from src.gpt_sovits_emotion_manager.utils import emotion_to_str
+from src.gpt_sovits_emotion_manager.llm import close_backends
 from src.gpt_sovits_emotion_manager.log import setup_logger, log
-from src.gpt_sovits_emotion_manager.models import EmotionAnnotation, Emotion
+from src.gpt_sovits_emotion_manager.profiling import Profiler, span
+from src.gpt_sovits_emotion_manager.models import Emotion
+from src.gpt_sovits_emotion_manager.utils import emotion_to_str, read_speakers
+from src.gpt_sovits_emotion_manager.scheduler import DeadlineExceeded
+from src.gpt_sovits_emotion_manager.registry import AnnotationRegistry
+from src.gpt_sovits_emotion_manager.workers import close_worker_pool
 
 
 def log_prompt(emotion_types: str):
@@ -31,49 +36,70 @@ def log_prompt(emotion_types: str):
     )
 
 
-async def main(file_path: Path):
-    config = load_config()
+def parse_shards(file_paths: List[str]) -> Dict[str, List[Path]]:
+    """解析 `speaker=path` 格式的文件参数
+
+    只有第一个 `=` 之前不含路径分隔符时才视为说话人, 因此路径本身可以包含 `=`。
+    未指定说话人时, 如果文件中的标注来自多个说话人(例如多说话人 .list 文件的标注结果), 则按标注的 `speaker` 字段
+    注册每个说话人, 否则使用文件名作为说话人
+    """
+    shards: Dict[str, List[Path]] = {}
+    for item in file_paths:
+        speaker, separator, path = item.partition("=")
+        if not separator or not speaker or "/" in speaker or "\\" in speaker:
+            speaker, path = "", item
+        path = Path(path)
+        if not speaker:
+            speakers = read_speakers(path) if path.exists() else []
+            if len(speakers) > 1:
+                for speaker in speakers:
+                    shards.setdefault(speaker, []).append(path)
+                continue
+            speaker = path.stem.removesuffix("_emotion_annotation")
+        shards.setdefault(speaker, []).append(path)
+    return shards
+
+
+async def main(shards: Dict[str, List[Path]], config_path: Optional[str]):
+    config = load_config(config_path)
 
     setup_logger(config)
 
-    emotion_annotations = []
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for item in data:
-            emotions = [
-                Emotion(type=emotion["type"], intensity=emotion["intensity"])
-                for emotion in item["emotions"]
-            ]
-            emotion_annotations.append(
-                EmotionAnnotation(
-                    emotions=emotions,
-                    text=item["text"],
-                    file=item["file"],
-                    language=item["language"],
-                )
-            )
-
-    if len(emotion_annotations) == 0:
+    registry = AnnotationRegistry.from_files(shards, config)
+
+    try:
+        await registry.get()
+    except ValueError:
         log("ERROR", "No emotion annotations found in the file.")
         return None
 
-    inferer = Inferer(emotion_annotations, config)
+    inferer = Inferer(None, config, registry=registry)
 
     while True:
+        speaker = None
+        if len(registry.speakers) > 1:
+            while True:
+                speaker = input("Speaker: ").strip()
+                if speaker not in registry.speakers:
+                    log("ERROR", "Invalid speaker!")
+                    log(
+                        "INFO", f"Valid speakers: <y>{', '.join(registry.speakers)}</y>"
+                    )
+                else:
+                    break
+
         text = input("Text: ")
         while True:
             emotions_text = input("Emotions (leave empty for LLM): ").strip().lower()
             if not emotions_text:
                 emotions = None
-                log("INFO", "No emotions specified, using LLM to infer emotions.")
+                log("INFO", "No emotions specified, inferring emotions from the text.")
                 try:
-                    emotions = await inferer.get_emotion_from_text(text)
-                    log("INFO", f"Emotions inferred by LLM: {emotion_to_str(emotions)}")
+                    emotions = await inferer.get_emotion_from_text(text, speaker)
                 except Exception as e:
                     log(
                         "WARNING",
-                        f"Failed to infer emotions by LLM, using default emotion: {config.emotion_types[0]}:low",
+                        f"Failed to infer emotions, using default emotion: {config.emotion_types[0]}:low",
                     )
                     emotions = [Emotion(type=config.emotion_types[0], intensity="low")]
                 break
@@ -111,8 +137,8 @@ async def main(file_path: Path):
 
         log("INFO", "Generating content...")
         try:
-            result = await inferer.generate(text, language, emotions)
-        except TimeoutException:
+            result = await inferer.generate(text, language, emotions, speaker)
+        except (TimeoutException, DeadlineExceeded):
             log("ERROR", "Timeout occurred, please try again.")
             continue
         except Exception as e:
@@ -126,7 +152,7 @@ async def main(file_path: Path):
 
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(output_path, "wb") as f:
+        with span("inferer.write_audio"), open(output_path, "wb") as f:
             f.write(result)
 
         log(
@@ -135,12 +161,36 @@ async def main(file_path: Path):
         )
 
 
+async def run(shards: Dict[str, List[Path]], config_path: Optional[str]):
+    # 交互会话以 EOF / Ctrl+C 结束, 需要在事件循环关闭前释放 LLM 后端的连接
+    try:
+        await main(shards, config_path)
+    finally:
+        await close_backends()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Run the GPT-SoVITS emotion inference."
     )
     parser.add_argument(
-        "--file-path", "-f", type=str, help="The path to the emotion annotations file."
+        "--file-path",
+        "-f",
+        type=str,
+        nargs="+",
+        help="The paths to the emotion annotations files, optionally prefixed with `speaker=`.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the session and write the results to `outputs/profiles` on exit.",
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=str,
+        default=None,
+        help="The path to the config file. Defaults to `config.yaml`.",
     )
     args = parser.parse_args()
 
@@ -150,8 +200,20 @@ if __name__ == "__main__":
         )
         exit(1)
 
-    if not Path(args.file_path).exists():
-        print(f"File not found: {args.file_path}")
-        exit(1)
-
-    asyncio.run(main(Path(args.file_path)))
+    shards = parse_shards(args.file_path)
+
+    for paths in shards.values():
+        for path in paths:
+            if not path.exists():
+                print(f"File not found: {path}")
+                exit(1)
+
+    profiler = Profiler("inferer") if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        asyncio.run(run(shards, args.config))
+    finally:
+        close_worker_pool()
+        if profiler is not None:
+            profiler.stop()
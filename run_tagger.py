@@ -1,48 +1,96 @@
-import json
+import glob
 import asyncio
 import argparse
 from pathlib import Path
+from collections import Counter
+from typing import Dict, List, Optional
 
 from src.gpt_sovits_emotion_manager import Tagger
 from src.gpt_sovits_emotion_manager.config import load_config
-from src.gpt_sovits_emotion_manager.utils import dump_dataclass
+from src.gpt_sovits_emotion_manager.llm import close_backends
 from src.gpt_sovits_emotion_manager.log import setup_logger, log
+from src.gpt_sovits_emotion_manager.profiling import Profiler, span
+from src.gpt_sovits_emotion_manager.utils import (
+    AnnotationWriter,
+    Progress,
+    jsonl_to_json,
+)
+
+
+def count_lines(file_path: Path) -> int:
+    # 只统计 `Tagger.iter_list_file` 会读取的行, 格式错误的行会被跳过
+    with open(file_path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip() and Tagger.parse_line(line.strip()))
+
+
+def output_paths(file_paths: List[Path]) -> Dict[Path, Path]:
+    """为每个列表文件生成输出路径。文件名相同的列表文件会以所在目录名作为前缀, 例如 `a/spk.list` 与 `b/spk.list`
+
+    Raises:
+        ValueError: 如果加上目录名后输出路径仍然重复
+    """
+    stems = Counter(file_path.stem for file_path in file_paths)
+    result = {}
+    for file_path in file_paths:
+        name = file_path.stem
+        if stems[name] > 1:
+            name = f"{file_path.resolve().parent.name}_{name}"
+        result[file_path] = (
+            Path("outputs") / "emotions" / f"{name}_emotion_annotation.jsonl"
+        )
 
+    seen: Dict[Path, Path] = {}
+    for file_path, output_path in result.items():
+        if output_path in seen:
+            raise ValueError(
+                f"{seen[output_path]} and {file_path} would both be written to {output_path}"
+            )
+        seen[output_path] = file_path
+    return result
 
-async def main(file_path: Path):
-    config = load_config()
-
-    setup_logger(config)
-
-    tagger = Tagger(config)
-
-    list_annotations = tagger.from_list_file(file_path)
 
-    annotations = await tagger.tag(list_annotations)
+async def tag_file(
+    tagger: Tagger,
+    file_path: Path,
+    output_path: Path,
+    progress: Progress,
+    write_json: bool,
+):
+    output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    log(
-        "INFO",
-        f"Tagging finished!",
-    )
+    check_duration = tagger.config.tagger.check_duration
 
-    if config.tagger.check_duration:
+    if check_duration:
         log(
             "INFO",
             "Checking audio durations. Audios not within the range of 3-10 seconds will be removed.",
         )
-        try:
-            annotations = tagger.check_duration(annotations)
-        except Exception as e:
-            log("ERROR", f"Failed to check audio durations", e)
 
-    Path("outputs/emotions").mkdir(parents=True, exist_ok=True)
+    with AnnotationWriter(output_path) as writer:
+        async for annotations in tagger.tag_stream(
+            tagger.iter_list_file(file_path), progress=progress.update
+        ):
+            if check_duration:
+                try:
+                    annotations = await asyncio.to_thread(
+                        tagger.check_duration, annotations
+                    )
+                except Exception as e:
+                    log("ERROR", f"Failed to check audio durations", e)
+            with span("tagger.write"):
+                writer.write(annotations)
 
-    output_path = (
-        Path("outputs") / "emotions" / f"{file_path.stem}_emotion_annotation.json"
+    log(
+        "INFO",
+        f"Tagging <y>{file_path}</y> finished with <c>{writer.count}</c> annotations!",
     )
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(dump_dataclass(annotations), f, ensure_ascii=False, indent=4)
+    if write_json:
+        with span("tagger.write_json"):
+            await asyncio.to_thread(
+                jsonl_to_json, output_path, output_path.with_suffix(".json")
+            )
+        output_path = output_path.with_suffix(".json")
 
     log(
         "INFO",
@@ -50,10 +98,58 @@ async def main(file_path: Path):
     )
 
 
+async def main(
+    file_paths: Dict[Path, Path], write_json: bool, config_path: Optional[str]
+):
+    config = load_config(config_path)
+
+    setup_logger(config)
+
+    # 所有文件共用一个 Tagger，从而共用同一个 LLM 后端的并发与速率限制
+    tagger = Tagger(config)
+
+    try:
+        progress = Progress(sum(count_lines(file_path) for file_path in file_paths))
+
+        log("INFO", f"Tagging <c>{progress.total}</c> lines in {len(file_paths)} files")
+
+        await asyncio.gather(
+            *[
+                tag_file(tagger, file_path, output_path, progress, write_json)
+                for file_path, output_path in file_paths.items()
+            ]
+        )
+
+        log("INFO", "All files tagged!")
+    finally:
+        await close_backends()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the emotion tagger.")
     parser.add_argument(
-        "--file-path", "-f", type=str, help="The path to the list file."
+        "--file-path",
+        "-f",
+        type=str,
+        nargs="+",
+        help="The paths or glob patterns of the list files.",
+    )
+    parser.add_argument(
+        "--no-json",
+        action="store_true",
+        help="Only write the streamed .jsonl annotations, skip the final .json file.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run and write the results to `outputs/profiles`.",
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=str,
+        default=None,
+        help="The path to the config file. Defaults to `config.yaml`.",
     )
     args = parser.parse_args()
 
@@ -62,4 +158,30 @@ if __name__ == "__main__":
             "Please specify the path to the list file, e.g. `python run_tagger.py -f /path/to/list_file.txt`"
         )
         exit(1)
-    asyncio.run(main(Path(args.file_path)))
+
+    file_paths = []
+    for pattern in args.file_path:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for match in matches:
+            if Path(match).resolve() not in [p.resolve() for p in file_paths]:
+                file_paths.append(Path(match))
+
+    for file_path in file_paths:
+        if not file_path.exists():
+            print(f"File not found: {file_path}")
+            exit(1)
+
+    try:
+        file_paths = output_paths(file_paths)
+    except ValueError as e:
+        print(f"Conflicting output paths: {e}")
+        exit(1)
+
+    profiler = Profiler("tagger") if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        asyncio.run(main(file_paths, not args.no_json, args.config))
+    finally:
+        if profiler is not None:
+            profiler.stop()
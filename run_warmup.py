@@ -0,0 +1,135 @@
+import json
+import shutil
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Optional
+
+from src.gpt_sovits_emotion_manager import Inferer
+from src.gpt_sovits_emotion_manager.config import load_config
+from src.gpt_sovits_emotion_manager.llm import close_backends
+from src.gpt_sovits_emotion_manager.log import setup_logger, log
+from src.gpt_sovits_emotion_manager.warmup import check_references, prime_backend
+from src.gpt_sovits_emotion_manager.workers import close_worker_pool
+from src.gpt_sovits_emotion_manager.utils import (
+    AnnotationWriter,
+    dump_dataclass,
+    load_emotion_annotations,
+)
+
+
+async def main(
+    file_path: Path,
+    output_path: Path,
+    prime: int,
+    concurrency: int,
+    config_path: Optional[str],
+):
+    config = load_config(config_path)
+
+    setup_logger(config)
+
+    annotations = load_emotion_annotations(file_path)
+
+    log("INFO", f"Checking <c>{len(annotations)}</c> reference audios...")
+
+    annotations, invalid = await check_references(annotations, concurrency)
+
+    for annotation, error in invalid:
+        log("WARNING", f"Invalid reference <y>{annotation.file}</y>: {error}")
+
+    log(
+        "INFO",
+        f"<c>{len(annotations)}</c> valid, <c>{len(invalid)}</c> invalid reference audios.",
+    )
+
+    if invalid or output_path != file_path:
+        if output_path == file_path:
+            backup_path = file_path.with_suffix(file_path.suffix + ".bak")
+            shutil.copyfile(file_path, backup_path)
+            log("INFO", f"Original emotion annotations backed up to {backup_path}")
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # 与 `load_emotion_annotations` 一致, 按后缀决定输出格式
+        if output_path.suffix == ".jsonl":
+            with AnnotationWriter(output_path) as writer:
+                writer.write(annotations)
+        else:
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(dump_dataclass(annotations), f, ensure_ascii=False, indent=4)
+
+        log(
+            "INFO",
+            f"Checked emotion annotations saved to <c><underline>{output_path.resolve().as_uri()}</underline></c>, click to open.",
+        )
+
+    if len(annotations) == 0:
+        log("ERROR", "No valid emotion annotations left.")
+        return None
+
+    if prime > 0:
+        log("INFO", f"Priming GPT-SoVITS with the top <c>{prime}</c> emotions...")
+        try:
+            await prime_backend(Inferer(annotations, config), prime)
+        finally:
+            await close_backends()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check reference audios and warm up the GPT-SoVITS backend."
+    )
+    parser.add_argument(
+        "--file-path", "-f", type=str, help="The path to the emotion annotations file."
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=None,
+        help="Where to save the checked annotations. Defaults to overwriting the input file.",
+    )
+    parser.add_argument(
+        "--prime",
+        type=int,
+        default=0,
+        help="Synthesize once with the N most frequent emotions to warm up the backend.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=32,
+        help="The number of reference audios checked at the same time.",
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=str,
+        default=None,
+        help="The path to the config file. Defaults to `config.yaml`.",
+    )
+    args = parser.parse_args()
+
+    if args.file_path is None:
+        print(
+            "Please specify the path to the emotion annotations file, e.g. `python run_warmup.py -f /path/to/emotion_annotations.json`"
+        )
+        exit(1)
+
+    if not Path(args.file_path).exists():
+        print(f"File not found: {args.file_path}")
+        exit(1)
+
+    file_path = Path(args.file_path)
+    try:
+        asyncio.run(
+            main(
+                file_path,
+                Path(args.output) if args.output else file_path,
+                args.prime,
+                args.concurrency,
+                args.config,
+            )
+        )
+    finally:
+        close_worker_pool()
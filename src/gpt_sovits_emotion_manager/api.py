@@ -24,6 +24,7 @@ async def generate(
     parallel_infer: bool = True,
     repetition_penalty: float = 1.35,
     media_type: str = "wav",
+    timeout: Optional[float] = 120,
 ) -> bytes:
     """Generate speech from text using GPT-SoVITS/api_v2.py
 
@@ -49,6 +50,7 @@ async def generate(
         parallel_infer (bool, optional): Whether to use parallel inference. Defaults to True.
         repetition_penalty (float, optional): Repetition penalty for T2S model. Defaults to 1.35.
         media_type (str, optional): Media type of the response. Defaults to "wav".
+        timeout (float, optional): Request timeout in seconds, None for no timeout. Defaults to 120.
 
     Raises:
         ValueError: If the response status code is 400
@@ -81,7 +83,7 @@ async def generate(
                 "repetition_penalty": repetition_penalty,
                 "media_type": media_type,
             },
-            timeout=120,
+            timeout=timeout,
         )
         if response.status_code == 400:
             raise ValueError(f"API Backend occurred an error: {response.json()}")
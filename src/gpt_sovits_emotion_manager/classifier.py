@@ -0,0 +1,251 @@
+import json
+import math
+from pathlib import Path
+from collections import Counter
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+from .models import EmotionAnnotation, Emotion
+from .utils import emotion_key, str_to_emotions
+
+
+def _check_dependencies() -> None:
+    if np is None or sparse is None:
+        raise ImportError(
+            "The local emotion classifier requires `numpy` and `scipy`, "
+            "please install them with `pip install numpy scipy`"
+        )
+
+
+class EmotionClassifier:
+    """基于字符 n-gram TF-IDF 与 kNN 的本地情感分类器
+
+    使用已由 LLM 标注好的情感标注作为训练数据，在 CPU 上毫秒级完成分类，
+    置信度不足时再交给 LLM 处理。
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        idf: "np.ndarray",
+        matrix: "sparse.csr_matrix",
+        labels: List[str],
+        label_ids: "np.ndarray",
+        ngram_range: Tuple[int, int] = (1, 3),
+        k: int = 5,
+    ) -> None:
+        """初始化情感分类器, 一般应使用 `fit` 创建
+
+        Args:
+            vocabulary (Dict[str, int]): n-gram 到特征下标的映射
+            idf (np.ndarray): 每个特征的 IDF 权重
+            matrix (sparse.csr_matrix): 训练样本经过 L2 归一化的 TF-IDF 矩阵
+            labels (List[str]): 情感标签, 由 `emotion_key` 生成
+            label_ids (np.ndarray): 每个训练样本对应的标签下标
+            ngram_range (Tuple[int, int], optional): 字符 n-gram 的长度范围. Defaults to (1, 3).
+            k (int, optional): 近邻数量. Defaults to 5.
+        """
+        _check_dependencies()
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix
+        self.labels = labels
+        self.label_ids = label_ids
+        self.ngram_range = ngram_range
+        self.k = k
+
+    @staticmethod
+    def _ngrams(text: str, ngram_range: Tuple[int, int]) -> Counter:
+        text = text.strip().lower()
+        return Counter(
+            text[i : i + n]
+            for n in range(ngram_range[0], ngram_range[1] + 1)
+            for i in range(len(text) - n + 1)
+        )
+
+    @classmethod
+    def fit(
+        cls,
+        annotations: List[EmotionAnnotation],
+        ngram_range: Tuple[int, int] = (1, 3),
+        k: int = 5,
+    ) -> "EmotionClassifier":
+        """使用情感标注训练分类器
+
+        Args:
+            annotations (List[EmotionAnnotation]): 情感标注列表
+            ngram_range (Tuple[int, int], optional): 字符 n-gram 的长度范围. Defaults to (1, 3).
+            k (int, optional): 近邻数量. Defaults to 5.
+
+        Raises:
+            ValueError: 如果没有可用的训练数据
+
+        Returns:
+            EmotionClassifier: 训练好的分类器
+        """
+        _check_dependencies()
+        annotations = [a for a in annotations if a.emotions]
+        if not annotations:
+            raise ValueError("No emotion annotations to fit the classifier")
+
+        vocabulary: Dict[str, int] = {}
+        document_frequency: List[int] = []
+        rows, cols, counts = [], [], []
+        for row, annotation in enumerate(annotations):
+            for ngram, count in cls._ngrams(annotation.text, ngram_range).items():
+                col = vocabulary.get(ngram)
+                if col is None:
+                    col = vocabulary[ngram] = len(vocabulary)
+                    document_frequency.append(0)
+                document_frequency[col] += 1
+                rows.append(row)
+                cols.append(col)
+                counts.append(count)
+
+        idf = np.log((1 + len(annotations)) / (1 + np.asarray(document_frequency))) + 1
+        values = (1 + np.log(np.asarray(counts, dtype=np.float64))) * idf[cols]
+        matrix = sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(annotations), len(vocabulary))
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+        labels: Dict[str, int] = {}
+        label_ids = np.asarray(
+            [
+                labels.setdefault(emotion_key(a.emotions), len(labels))
+                for a in annotations
+            ]
+        )
+
+        return cls(
+            vocabulary=vocabulary,
+            idf=idf,
+            matrix=matrix,
+            labels=list(labels),
+            label_ids=label_ids,
+            ngram_range=ngram_range,
+            k=k,
+        )
+
+    def save(self, directory: Path) -> None:
+        """将分类器保存到目录, 矩阵以 `.npy` 格式保存以便 `load` 内存映射
+
+        Args:
+            directory (Path): 目录
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "data.npy", self.matrix.data)
+        np.save(directory / "indices.npy", self.matrix.indices)
+        np.save(directory / "indptr.npy", self.matrix.indptr)
+        np.save(directory / "idf.npy", self.idf)
+        np.save(directory / "label_ids.npy", self.label_ids)
+        with open(directory / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "shape": list(self.matrix.shape),
+                    "vocabulary": self.vocabulary,
+                    "labels": self.labels,
+                    "ngram_range": list(self.ngram_range),
+                    "k": self.k,
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "EmotionClassifier":
+        """从 `save` 保存的目录加载分类器
+
+        Args:
+            directory (Path): 目录
+            mmap (bool, optional): 是否以内存映射方式加载矩阵, 多个进程加载同一目录时共享同一份物理内存. Defaults to True.
+
+        Returns:
+            EmotionClassifier: 分类器
+        """
+        _check_dependencies()
+        mmap_mode = "r" if mmap else None
+        with open(directory / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        matrix = sparse.csr_matrix(
+            (
+                np.load(directory / "data.npy", mmap_mode=mmap_mode),
+                np.load(directory / "indices.npy", mmap_mode=mmap_mode),
+                np.load(directory / "indptr.npy", mmap_mode=mmap_mode),
+            ),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        return cls(
+            vocabulary=meta["vocabulary"],
+            idf=np.load(directory / "idf.npy", mmap_mode=mmap_mode),
+            matrix=matrix,
+            labels=meta["labels"],
+            label_ids=np.load(directory / "label_ids.npy", mmap_mode=mmap_mode),
+            ngram_range=tuple(meta["ngram_range"]),
+            k=meta["k"],
+        )
+
+    def _vectorize(self, text: str) -> "sparse.csr_matrix":
+        # 训练数据中没有出现过的 n-gram 按最大的 IDF 计入范数, 否则只有少量字符相同的文本也会得到很高的相似度
+        unseen_idf = math.log(1 + self.matrix.shape[0]) + 1
+        cols, values, unseen = [], [], 0.0
+        for ngram, count in self._ngrams(text, self.ngram_range).items():
+            col = self.vocabulary.get(ngram)
+            if col is not None:
+                cols.append(col)
+                values.append((1 + math.log(count)) * self.idf[col])
+            else:
+                unseen += ((1 + math.log(count)) * unseen_idf) ** 2
+
+        vector = np.asarray(values, dtype=np.float64)
+        norm = math.sqrt(float(vector @ vector) + unseen)
+        if norm > 0:
+            vector /= norm
+        return sparse.csr_matrix(
+            (vector, ([0] * len(cols), cols)), shape=(1, len(self.vocabulary))
+        )
+
+    def score(self, text: str) -> Tuple[List[Emotion], float, float]:
+        """预测文本的情感, 并分别返回投票占比与近邻相似度
+
+        Args:
+            text (str): 待分析的文本
+
+        Returns:
+            Tuple[List[Emotion], float, float]: 预测的情感、得票最多的标签在近邻相似度中所占的比例与 k 个近邻的平均余弦相似度
+        """
+        similarities = (self.matrix @ self._vectorize(text).T).toarray().ravel()
+        k = min(self.k, len(similarities))
+        neighbours = np.argpartition(-similarities, k - 1)[:k]
+
+        votes: Dict[int, float] = {}
+        for i in neighbours:
+            votes[self.label_ids[i]] = votes.get(self.label_ids[i], 0) + similarities[i]
+
+        label_id, score = max(votes.items(), key=lambda x: x[1])
+        total = sum(votes.values())
+        share = float(score / total) if total > 0 else 0.0
+        return str_to_emotions(self.labels[label_id]), share, float(total / k)
+
+    def predict(self, text: str) -> Tuple[List[Emotion], float]:
+        """预测文本的情感
+
+        Args:
+            text (str): 待分析的文本
+
+        Returns:
+            Tuple[List[Emotion], float]: 预测的情感与置信度。置信度为投票占比乘以近邻的平均相似度,
+                与训练数据都不相似的文本即使近邻标签一致, 置信度也很低
+        """
+        emotions, share, similarity = self.score(text)
+        return emotions, share * similarity
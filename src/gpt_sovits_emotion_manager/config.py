@@ -1,6 +1,10 @@
+import os
+import math
 import yaml
-from typing import Literal, List
-from dataclasses import dataclass
+import pickle
+from pathlib import Path
+from dataclasses import dataclass, field, fields, is_dataclass, MISSING
+from typing import Any, Dict, Literal, List, Optional, Union, get_args, get_origin
 
 
 @dataclass
@@ -22,6 +26,9 @@ class InferenceConfig:
     parallel_infer: bool
     repetition_penalty: float
     media_type: str
+    max_speakers: int = 8
+    max_concurrency: int = 1
+    timeout: float = 120
 
 
 @dataclass
@@ -31,9 +38,30 @@ class TaggerConfig:
 
 @dataclass
 class LLMConfig:
-    model: Literal["gemini-1.5-flash", "gemini-1.5-pro"]
+    model: str
     api_key: str
-    proxy: str
+    proxy: Optional[str]
+    provider: Literal["gemini", "openai"] = "gemini"
+    base_url: Optional[str] = None
+    max_concurrency: int = 8
+    requests_per_minute: Optional[int] = None
+    timeout: float = 120
+
+
+@dataclass
+class ClassifierConfig:
+    enabled: bool = False
+    k: int = 5
+    threshold: float = 0.4
+    min_ngram: int = 1
+    max_ngram: int = 3
+
+
+@dataclass
+class WorkersConfig:
+    enabled: bool = False
+    processes: int = 0
+    cache_dir: str = ".cache/workers"
 
 
 @dataclass
@@ -43,15 +71,223 @@ class Config:
     inference: InferenceConfig
     tagger: TaggerConfig
     llm: LLMConfig
+    classifier: ClassifierConfig = field(default_factory=ClassifierConfig)
+    workers: WorkersConfig = field(default_factory=WorkersConfig)
+
+
+class ConfigError(ValueError):
+    pass
+
+
+ENV_PREFIX = "GSEM__"
+# 例如 `GSEM__LLM__API_KEY=xxx` 会覆盖 `llm.api_key`
+
+_TRUE = {"true", "yes", "on", "1"}
+_FALSE = {"false", "no", "off", "0"}
+
+
+def _join(path: str, key: str) -> str:
+    return f"{path}.{key}" if path else key
+
+
+def _coerce(value: Any, tp: Any, path: str) -> Any:
+    origin = get_origin(tp)
+
+    if is_dataclass(tp):
+        if not isinstance(value, dict):
+            raise ConfigError(f"`{path}` should be a mapping, got {value!r}")
+        known = {f.name: f for f in fields(tp)}
+        unknown = set(value) - set(known)
+        if unknown:
+            raise ConfigError(
+                f"Unknown config {', '.join(f'`{_join(path, k)}`' for k in sorted(unknown))}"
+            )
+        missing = [
+            name
+            for name, f in known.items()
+            if name not in value
+            and f.default is MISSING
+            and f.default_factory is MISSING
+        ]
+        if missing:
+            raise ConfigError(
+                f"Missing config {', '.join(f'`{_join(path, k)}`' for k in missing)}"
+            )
+        return tp(
+            **{k: _coerce(v, known[k].type, _join(path, k)) for k, v in value.items()}
+        )
+
+    if origin is Union:
+        args = get_args(tp)
+        if type(None) in args and (
+            value is None
+            or (isinstance(value, str) and value.lower() in {"null", "none", "~"})
+        ):
+            return None
+        errors = []
+        for arg in args:
+            if arg is type(None):
+                continue
+            try:
+                return _coerce(value, arg, path)
+            except ConfigError as e:
+                errors.append(str(e))
+        raise ConfigError(
+            errors[0] if len(errors) == 1 else f"Invalid `{path}`: {value!r}"
+        )
+
+    if origin is Literal:
+        for option in get_args(tp):
+            if value == option or (
+                isinstance(value, str)
+                and isinstance(option, str)
+                and value.lower() == option.lower()
+            ):
+                return option
+        raise ConfigError(
+            f"`{path}` should be one of {', '.join(map(str, get_args(tp)))}, got {value!r}"
+        )
+
+    if origin is list:
+        if isinstance(value, str):
+            # 来自环境变量的列表, 例如 `[joy, fear]`
+            value = yaml.safe_load(value)
+        if not isinstance(value, list):
+            raise ConfigError(f"`{path}` should be a list, got {value!r}")
+        (item_type,) = get_args(tp)
+        return [_coerce(v, item_type, f"{path}[{i}]") for i, v in enumerate(value)]
+
+    if tp is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in _TRUE | _FALSE:
+            return value.lower() in _TRUE
+        raise ConfigError(f"`{path}` should be a boolean, got {value!r}")
+
+    if tp in (int, float):
+        if isinstance(value, bool):
+            raise ConfigError(f"`{path}` should be a number, got {value!r}")
+        try:
+            number = tp(value)
+        except (TypeError, ValueError):
+            raise ConfigError(f"`{path}` should be a number, got {value!r}") from None
+        if tp is int and isinstance(value, float) and value != number:
+            raise ConfigError(f"`{path}` should be an integer, got {value!r}")
+        return number
+
+    if tp is str:
+        if isinstance(value, (dict, list)) or value is None:
+            raise ConfigError(f"`{path}` should be a string, got {value!r}")
+        return str(value)
+
+    return value
+
+
+def _apply_env_overrides(data: Dict[str, Any], environ: Dict[str, str]) -> None:
+    for key, value in environ.items():
+        if not key.startswith(ENV_PREFIX):
+            continue
+        *parents, name = key[len(ENV_PREFIX) :].lower().split("__")
+        section = data
+        for i, parent in enumerate(parents):
+            section = section.setdefault(parent, {})
+            if not isinstance(section, dict):
+                raise ConfigError(
+                    f"Cannot override `{'.'.join(parents[: i + 1])}` with {key}, it is not a mapping"
+                )
+        # 保留原始字符串, 由 `_coerce` 根据字段类型转换
+        section[name] = value
+
+
+def _validate(config: Config) -> None:
+    if not config.emotion_types:
+        raise ConfigError("`emotion_types` should not be empty")
+    if len(set(config.emotion_types)) != len(config.emotion_types):
+        raise ConfigError("`emotion_types` should not contain duplicates")
+    if config.workers.processes < 0:
+        raise ConfigError(
+            f"`workers.processes` should not be negative, got {config.workers.processes}"
+        )
+    if config.llm.provider == "openai" and not config.llm.base_url:
+        raise ConfigError("`llm.base_url` is required when `llm.provider` is openai")
+    for path, value in {
+        "inference.max_aux_refs": config.inference.max_aux_refs,
+        "inference.top_k": config.inference.top_k,
+        "inference.batch_size": config.inference.batch_size,
+        "inference.max_speakers": config.inference.max_speakers,
+        "inference.max_concurrency": config.inference.max_concurrency,
+        "llm.max_concurrency": config.llm.max_concurrency,
+        "classifier.k": config.classifier.k,
+    }.items():
+        if value < 1:
+            raise ConfigError(f"`{path}` should be at least 1, got {value}")
+    for path, value in {
+        "inference.timeout": config.inference.timeout,
+        "llm.timeout": config.llm.timeout,
+    }.items():
+        if not (math.isfinite(value) and value > 0):
+            raise ConfigError(f"`{path}` should be a positive number, got {value}")
+    if not 0 <= config.classifier.threshold <= 1:
+        raise ConfigError(
+            f"`classifier.threshold` should be between 0 and 1, got {config.classifier.threshold}"
+        )
+    if not 1 <= config.classifier.min_ngram <= config.classifier.max_ngram:
+        raise ConfigError(
+            "`classifier.min_ngram` and `classifier.max_ngram` should satisfy "
+            f"1 <= min_ngram <= max_ngram, got {config.classifier.min_ngram} and {config.classifier.max_ngram}"
+        )
+
+
+def load_config(path: Optional[str] = None, use_cache: bool = True) -> Config:
+    """读取、校验并缓存配置
+
+    配置文件路径依次取自 `path`、环境变量 `GSEM_CONFIG` 与当前目录下的 `config.yaml`。
+    以 `GSEM__` 开头的环境变量会覆盖配置项，层级之间用 `__` 分隔。
+    配置文件的解析结果会以 pickle 缓存在配置文件所在目录的 `.cache` 下，配置文件变化时缓存失效。
+    环境变量不会写入缓存，每次读取时再覆盖，因此可以通过环境变量传入 API Key 等敏感信息
+
+    Args:
+        path (Optional[str], optional): 配置文件路径. Defaults to None.
+        use_cache (bool, optional): 是否使用缓存. Defaults to True.
+
+    Raises:
+        ConfigError: 如果配置项缺失、多余或类型错误
+
+    Returns:
+        Config: 配置对象
+    """
+    config_path = Path(path or os.environ.get("GSEM_CONFIG") or "config.yaml")
+    if not config_path.exists():
+        raise ConfigError(f"Config file not found: {config_path}")
+
+    stat = config_path.stat()
+    cache_key = (str(config_path.resolve()), stat.st_mtime_ns, stat.st_size)
+    cache_path = config_path.resolve().parent / ".cache" / f"{config_path.stem}.pickle"
+
+    data = None
+    if use_cache and cache_path.exists():
+        try:
+            with open(cache_path, "rb") as f:
+                key, cached = pickle.load(f)
+            if key == cache_key:
+                data = cached
+        except Exception:
+            # 缓存损坏时重新解析
+            pass
 
+    if data is None:
+        with open(config_path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
 
-def load_config() -> Config:
-    def recursive_load(data, cls):
-        if hasattr(cls, "__dataclass_fields__"):
-            fieldtypes = {f.name: f.type for f in cls.__dataclass_fields__.values()}
-            return cls(**{k: recursive_load(v, fieldtypes[k]) for k, v in data.items()})
-        return data
+        if use_cache:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(cache_path, "wb") as f:
+                    pickle.dump((cache_key, data), f)
+            except OSError:
+                pass
 
-    with open("config.yaml", "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-        return recursive_load(data, Config)
+    _apply_env_overrides(data, os.environ)
+    config = _coerce(data, Config, "")
+    _validate(config)
+    return config
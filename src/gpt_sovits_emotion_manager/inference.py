@@ -1,15 +1,15 @@
-import os
-import re
 import json
 import random
-import google.generativeai as genai
 from typing import List, Optional, Literal
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
 from .log import log
 from .api import generate
 from .config import Config
-from .utils import equal_emotions
+from .llm import LLMBackend, get_backend
+from .profiling import span
+from .scheduler import Priority, Scheduler
+from .registry import AnnotationRegistry
+from .utils import derive_seed, emotion_key, emotion_to_str
 from .models import EmotionAnnotation, Emotion
 
 
@@ -22,13 +22,15 @@ _prompt = """
 
 请注意，情感标签可能不止一个，因此你需要为每个文本生成一个或多个情感标签。
 
-你只需要返回一个包含情感标签的JSON数组，每个情感标签由情感类型和强度组成，不需要解释原因。
+你只需要返回一个JSON对象，其 `emotions` 字段为包含情感标签的数组，每个情感标签由情感类型和强度组成，不需要解释原因。
 
 示例返回:
 ```json
-[
-    {{"type": "joy", "intensity": "moderate"}}
-]
+{{
+    "emotions": [
+        {{"type": "joy", "intensity": "moderate"}}
+    ]
+}}
 ```
 
 文本:
@@ -37,40 +39,51 @@ _prompt = """
 
 class Inferer:
     def __init__(
-        self, emotion_annotations: List[EmotionAnnotation], config: Config
+        self,
+        emotion_annotations: Optional[List[EmotionAnnotation]],
+        config: Config,
+        backend: Optional[LLMBackend] = None,
+        registry: Optional[AnnotationRegistry] = None,
     ) -> None:
         """初始化推理器
 
         Args:
-            emotion_annotations (List[EmotionAnnotation]): 情感标注对象列表
+            emotion_annotations (Optional[List[EmotionAnnotation]]): 情感标注对象列表, 使用 `registry` 时传入 None
             config (Config): 配置对象
+            backend (Optional[LLMBackend], optional): LLM 后端, 为空时根据配置创建. Defaults to None.
+            registry (Optional[AnnotationRegistry], optional): 多说话人注册表, 为空时由 `emotion_annotations` 按说话人分组创建. Defaults to None.
+
+        Raises:
+            ValueError: 如果 `emotion_annotations` 与 `registry` 都为空
         """
+        if registry is None:
+            if emotion_annotations is None:
+                raise ValueError(
+                    "Either `emotion_annotations` or `registry` is required"
+                )
+            registry = AnnotationRegistry.from_annotations(emotion_annotations, config)
+
         self.config = config
-        self.emotion_annotations = emotion_annotations
-
-        genai.configure(api_key=config.llm.api_key)
-
-        if config.llm.proxy:
-            # 因为 `google.genrativeai` 底层使用 `gRPC` 通信，所以只能通过环境变量设置代理
-            os.environ["HTTP_PROXY"] = config.llm.proxy
-            os.environ["HTTPS_PROXY"] = config.llm.proxy
-
-        self.model = genai.GenerativeModel(
-            model_name=config.llm.model,
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            },
-            generation_config={"max_output_tokens": int(1e6)},
-        )
+        self.registry = registry
+        self._backend = backend
+        self.scheduler = Scheduler(config.inference.max_concurrency)
+
+    @property
+    def backend(self) -> LLMBackend:
+        # 仅在需要时才创建 LLM 后端, 只进行合成时无需连接 LLM
+        if self._backend is None:
+            self._backend = get_backend(self.config.llm)
+        return self._backend
 
     async def generate(
         self,
         text: str,
         language: Literal["zh", "ja", "en", "ko", "yue"],
         emotions: Optional[List[Emotion]] = None,
+        speaker: Optional[str] = None,
+        seed: Optional[int] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
     ) -> bytes:
         """生成语音
 
@@ -78,6 +91,13 @@ class Inferer:
             text (str): 待合成的文本
             language (Literal[&quot;zh&quot;, &quot;ja&quot;, &quot;en&quot;, &quot;ko&quot;, &quot;yue&quot;]): 文本语言
             emotions (Optional[List[Emotion]], optional): 目标情感. Defaults to None.
+            speaker (Optional[str], optional): 说话人, 为空时使用默认说话人. Defaults to None.
+            seed (Optional[int], optional): 随机种子, 为空时使用 `inference.seed`。辅助参考音频的选择由文本、情感、说话人与种子共同决定, 相同的请求总是发送相同的参数. Defaults to None.
+            priority (Priority, optional): 优先级, 交互请求会先于批量请求执行. Defaults to Priority.INTERACTIVE.
+            timeout (Optional[float], optional): 从调用开始计算的超时时间(秒), 包括排队时间, 为空时使用 `inference.timeout`. Defaults to None.
+
+        Raises:
+            DeadlineExceeded: 如果请求在完成前超过截止时间
 
         Returns:
             bytes: 生成的语音文件, 格式为 WAV
@@ -89,84 +109,110 @@ class Inferer:
             )
             emotions = [Emotion(type=self.config.emotion_types[0], intensity="low")]
 
-        emotion_annotations = self._find_emotion_annotations(emotions)
-        ref_path = None
-        aux_ref_path = []
-        prompt_text = None
-        prompt_language = None
+        index = await self.registry.get(speaker)
+        with span("inference.select_reference"):
+            match = index.references.lookup(emotions)
+        ref_path = match.annotations[0].file
+        aux_ref_path = [item.file for item in match.annotations[1:]]
+        prompt_text = match.annotations[0].text
+        prompt_language = match.annotations[0].language
+
+        log(
+            "INFO" if match.level == "exact" else "WARNING",
+            f"Using <y>{match.level}</y> match for <y>{emotion_to_str(emotions)}</y>: {ref_path}",
+        )
 
-        if len(emotion_annotations) == 0:
-            log(
-                "WARNING",
-                f"No matched emotion annotation found, using the first emotion annotation: {self.emotion_annotations[0].file}",
-            )
-            ref_path = self.emotion_annotations[0].file
-            prompt_text = self.emotion_annotations[0].text
-            prompt_language = self.emotion_annotations[0].language
-        elif len(emotion_annotations) == 1 and self.config.inference.use_aux_ref:
+        if len(match.annotations) == 1 and self.config.inference.use_aux_ref:
             log(
                 "WARNING",
                 f"Only one matched emotion annotation found, unable to use auxiliary reference",
             )
-            ref_path = emotion_annotations[0].file
-            prompt_text = emotion_annotations[0].text
-            prompt_language = emotion_annotations[0].language
-        else:
-            ref_path = emotion_annotations[0].file
-            aux_ref_path = [item.file for item in emotion_annotations[1:]]
-            prompt_text = emotion_annotations[0].text
-            prompt_language = emotion_annotations[0].language
+
+        if seed is None:
+            seed = self.config.inference.seed
 
         if len(aux_ref_path) > self.config.inference.max_aux_refs:
-            aux_ref_path = random.sample(
-                aux_ref_path, self.config.inference.max_aux_refs
+            rng = random.Random(
+                derive_seed(text, language, emotion_key(emotions), index.speaker, seed)
             )
+            aux_ref_path = rng.sample(aux_ref_path, self.config.inference.max_aux_refs)
 
         if self.config.inference.use_aux_ref:
             log("INFO", f"Using {len(aux_ref_path)} auxiliary references")
 
-        wav_file = await generate(
-            base_url=self.config.inference.base_url,
-            text=text,
-            text_lang=language,
-            ref_audio_path=ref_path,
-            aux_ref_audio_paths=(
-                aux_ref_path if self.config.inference.use_aux_ref else None
-            ),
-            prompt_text=prompt_text,
-            prompt_lang=prompt_language,
-            top_k=self.config.inference.top_k,
-            top_p=self.config.inference.top_p,
-            temperature=self.config.inference.temperature,
-            text_split_method=self.config.inference.text_split_method,
-            batch_size=self.config.inference.batch_size,
-            batch_threshold=self.config.inference.batch_threshold,
-            split_bucket=self.config.inference.split_bucket,
-            speed_factor=self.config.inference.speed_factor,
-            fragment_interval=self.config.inference.fragment_interval,
-            streaming_mode=self.config.inference.streaming_mode,
-            seed=self.config.inference.seed,
-            parallel_infer=self.config.inference.parallel_infer,
-            repetition_penalty=self.config.inference.repetition_penalty,
-            media_type=self.config.inference.media_type,
+        async def request(remaining: Optional[float]) -> bytes:
+            # 调用方被取消时, 正在进行的 `/tts` 请求也会被取消
+            with span("api.tts"):
+                return await generate(
+                    base_url=self.config.inference.base_url,
+                    text=text,
+                    text_lang=language,
+                    ref_audio_path=ref_path,
+                    aux_ref_audio_paths=(
+                        aux_ref_path if self.config.inference.use_aux_ref else None
+                    ),
+                    prompt_text=prompt_text,
+                    prompt_lang=prompt_language,
+                    top_k=self.config.inference.top_k,
+                    top_p=self.config.inference.top_p,
+                    temperature=self.config.inference.temperature,
+                    text_split_method=self.config.inference.text_split_method,
+                    batch_size=self.config.inference.batch_size,
+                    batch_threshold=self.config.inference.batch_threshold,
+                    split_bucket=self.config.inference.split_bucket,
+                    speed_factor=self.config.inference.speed_factor,
+                    fragment_interval=self.config.inference.fragment_interval,
+                    streaming_mode=self.config.inference.streaming_mode,
+                    seed=seed,
+                    parallel_infer=self.config.inference.parallel_infer,
+                    repetition_penalty=self.config.inference.repetition_penalty,
+                    media_type=self.config.inference.media_type,
+                    timeout=remaining,
+                )
+
+        return await self.scheduler.run(
+            request,
+            priority,
+            timeout if timeout is not None else self.config.inference.timeout,
         )
 
-        return wav_file
-
-    async def get_emotion_from_text(self, text: str) -> List[Emotion]:
-        """使用 LLM 从文本中生成情感
+    async def get_emotion_from_text(
+        self, text: str, speaker: Optional[str] = None
+    ) -> List[Emotion]:
+        """从文本中生成情感。启用本地分类器时优先使用说话人的分类器, 置信度不足时再使用 LLM
 
         Args:
             text (str): 待分析的文本
+            speaker (Optional[str], optional): 说话人, 为空时使用默认说话人. Defaults to None.
 
         Returns:
             List[Emotion]: 从文本中生成的情感
         """
-        response = await self.model.generate_content_async(
-            _prompt.format(emotion_types=", ".join(self.config.emotion_types)) + text
-        )
-        json_str = re.sub(r"```json|```", "", response.text).strip()
-        data = json.loads(json_str)
+        index = await self.registry.get(speaker)
+        with span("inference.classify"):
+            prediction = await index.classify(text)
+        if prediction is not None:
+            emotions, confidence = prediction
+            if confidence >= self.config.classifier.threshold:
+                log(
+                    "INFO",
+                    f"Emotions classified locally with confidence {confidence:.2f}: {emotion_to_str(emotions)}",
+                )
+                return emotions
+            log(
+                "DEBUG",
+                f"Local classifier confidence {confidence:.2f} is below threshold, falling back to LLM",
+            )
+
+        with span("llm.request"):
+            response = await self.backend.generate(
+                _prompt.format(emotion_types=", ".join(self.config.emotion_types))
+                + text,
+                json_mode=True,
+            )
+        data = json.loads(response)
+        if isinstance(data, dict):
+            data = data.get("emotions", [])
         emotions = []
         for item in data:
             if (
@@ -179,47 +225,6 @@ class Inferer:
         if not emotions:
             log("WARNING", "No emotion found in the text, using default emotion")
             emotions = [Emotion(type=self.config.emotion_types[0], intensity="low")]
+        else:
+            log("INFO", f"Emotions inferred by LLM: {emotion_to_str(emotions)}")
         return emotions
-
-    def _find_emotion_annotations(
-        self, emotions: List[Emotion]
-    ) -> List[EmotionAnnotation]:
-        # 先找有没有完全匹配的
-        matched_emotion_annotations = []
-        for emotion_annotation in self.emotion_annotations:
-            if equal_emotions(emotion_annotation.emotions, emotions):
-                matched_emotion_annotations.append(emotion_annotation)
-
-        if matched_emotion_annotations:
-            return matched_emotion_annotations
-
-        # 再找有没有部分匹配的
-        intensity_mapping = {"low": 1, "moderate": 2, "high": 3}
-
-        best_matches = []
-        best_match_score = float("inf")
-
-        for item in self.emotion_annotations:
-            match_score = 0
-            for target_emotion in emotions:
-                found_match = False
-                for emotion in item.emotions:
-                    if emotion.type == target_emotion.type:
-                        intensity_diff = abs(
-                            intensity_mapping[emotion.intensity]
-                            - intensity_mapping[target_emotion.intensity]
-                        )
-                        match_score += intensity_diff
-                        found_match = True
-                        break
-                if not found_match:
-                    # 如果目标情绪在项目中没有找到，则应用一个大的惩罚
-                    match_score += 10
-
-            if match_score < best_match_score:
-                best_match_score = match_score
-                best_matches = [item]
-            elif match_score == best_match_score:
-                best_matches.append(item)
-
-        return best_matches
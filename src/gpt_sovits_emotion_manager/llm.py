@@ -0,0 +1,210 @@
+import os
+import time
+import asyncio
+import ipaddress
+import httpx
+from urllib.parse import urlsplit
+from typing import Dict, Optional, Protocol, Tuple
+
+from .config import LLMConfig
+
+
+class LLMBackend(Protocol):
+    """LLM 后端接口，`Tagger` 与 `Inferer` 通过它调用大语言模型"""
+
+    async def generate(self, prompt: str, json_mode: bool = False) -> str:
+        """生成文本
+
+        Args:
+            prompt (str): 提示词
+            json_mode (bool, optional): 是否要求模型直接输出 JSON. Defaults to False.
+
+        Returns:
+            str: 模型输出的文本
+        """
+        ...
+
+    async def aclose(self) -> None:
+        """释放后端持有的连接"""
+        ...
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: int) -> None:
+        """请求速率限制器, 将请求均匀分布在每分钟内
+
+        Args:
+            requests_per_minute (int): 每分钟最多发起的请求数
+        """
+        self.interval = 60 / requests_per_minute
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _is_local(url: str) -> bool:
+    host = urlsplit(url).hostname or ""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class GeminiBackend:
+    def __init__(self, config: LLMConfig) -> None:
+        """初始化 Gemini 后端
+
+        Args:
+            config (LLMConfig): LLM 配置对象
+        """
+        # 仅在使用 Gemini 时才导入，使用本地模型时无需安装 `google-generativeai`
+        import google.generativeai as genai
+        from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+        genai.configure(api_key=config.api_key)
+
+        if config.proxy:
+            # 因为 `google.genrativeai` 底层使用 `gRPC` 通信，所以只能通过环境变量设置代理
+            os.environ["HTTP_PROXY"] = config.proxy
+            os.environ["HTTPS_PROXY"] = config.proxy
+
+        self.model = genai.GenerativeModel(
+            model_name=config.model,
+            safety_settings={
+                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+            },
+            generation_config={"max_output_tokens": int(1e6)},
+        )
+        self.semaphore = asyncio.Semaphore(config.max_concurrency)
+        self.rate_limiter = (
+            RateLimiter(config.requests_per_minute)
+            if config.requests_per_minute
+            else None
+        )
+
+    async def generate(self, prompt: str, json_mode: bool = False) -> str:
+        generation_config = (
+            {"response_mime_type": "application/json"} if json_mode else None
+        )
+        async with self.semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            result = await self.model.generate_content_async(
+                prompt, generation_config=generation_config
+            )
+        # 这里可能 ValueError，记得在外面处理
+        return result.text
+
+    async def aclose(self) -> None:
+        pass
+
+
+class OpenAIBackend:
+    def __init__(self, config: LLMConfig) -> None:
+        """初始化 OpenAI 兼容后端，可用于 OpenAI、vLLM、llama.cpp 等提供 `/v1/chat/completions` 的服务
+
+        Args:
+            config (LLMConfig): LLM 配置对象
+        """
+        if not config.base_url:
+            raise ValueError("`llm.base_url` is required for the openai provider")
+
+        self.config = config
+        self.client = httpx.AsyncClient(
+            base_url=config.base_url.rstrip("/"),
+            headers=(
+                {"Authorization": f"Bearer {config.api_key}"} if config.api_key else {}
+            ),
+            # 本地服务不经过代理, 否则 `proxy` 保持默认值时会连接失败
+            proxy=None if _is_local(config.base_url) else config.proxy or None,
+            limits=httpx.Limits(
+                max_connections=config.max_concurrency,
+                max_keepalive_connections=config.max_concurrency,
+            ),
+            timeout=config.timeout,
+        )
+        self.semaphore = asyncio.Semaphore(config.max_concurrency)
+        self.rate_limiter = (
+            RateLimiter(config.requests_per_minute)
+            if config.requests_per_minute
+            else None
+        )
+
+    async def generate(self, prompt: str, json_mode: bool = False) -> str:
+        payload = {
+            "model": self.config.model,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+
+        async with self.semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            response = await self.client.post("/chat/completions", json=payload)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_backends: Dict[
+    Tuple[str, str, Optional[str], str, Optional[str], int, Optional[int], float],
+    LLMBackend,
+] = {}
+
+
+def get_backend(config: LLMConfig) -> LLMBackend:
+    """获取 LLM 后端。相同配置会复用同一个后端实例，从而共享连接池与并发限制
+
+    Args:
+        config (LLMConfig): LLM 配置对象
+
+    Raises:
+        ValueError: 如果 `provider` 不受支持
+
+    Returns:
+        LLMBackend: LLM 后端
+    """
+    # 代理、并发、速率与超时都会影响后端实例, 因此全部作为键的一部分
+    key = (
+        config.provider,
+        config.model,
+        config.base_url,
+        config.api_key,
+        config.proxy,
+        config.max_concurrency,
+        config.requests_per_minute,
+        config.timeout,
+    )
+    if key in _backends:
+        return _backends[key]
+
+    if config.provider == "gemini":
+        backend = GeminiBackend(config)
+    elif config.provider == "openai":
+        backend = OpenAIBackend(config)
+    else:
+        raise ValueError(f"Unsupported LLM provider: {config.provider}")
+
+    _backends[key] = backend
+    return backend
+
+
+async def close_backends() -> None:
+    """关闭 `get_backend` 创建的所有后端, 未创建时什么也不做"""
+    backends = list(_backends.values())
+    _backends.clear()
+    for backend in backends:
+        await backend.aclose()
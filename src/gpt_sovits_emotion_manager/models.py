@@ -1,4 +1,4 @@
-from typing import List, Literal
+from typing import List, Literal, Optional
 from dataclasses import dataclass
 
 
@@ -14,6 +14,7 @@ class EmotionAnnotation:
     text: str
     language: Literal["zh", "ja", "en", "ko", "yue"]
     emotions: List[Emotion]
+    speaker: Optional[str] = None
 
 
 @dataclass
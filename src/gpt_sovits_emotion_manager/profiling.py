@@ -0,0 +1,128 @@
+import time
+import cProfile
+from pathlib import Path
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import yappi
+except ImportError:
+    yappi = None
+
+from .log import log
+
+_enabled = False
+_stack: ContextVar[Tuple[str, ...]] = ContextVar("profiling_stack", default=())
+# 调用栈 -> (总耗时, 次数)
+_spans: Dict[Tuple[str, ...], Tuple[float, int]] = {}
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """记录一个阶段的耗时, 未开启性能分析时几乎没有开销
+
+    阶段可以嵌套, 嵌套关系按 asyncio 任务分别记录, 因此并发任务的阶段不会互相混淆。
+    并发执行的阶段耗时会重叠, 所以各阶段耗时之和可能超过总耗时
+
+    Args:
+        name (str): 阶段名称
+    """
+    if not _enabled:
+        yield
+        return
+
+    stack = _stack.get() + (name,)
+    token = _stack.set(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stack.reset(token)
+        total, count = _spans.get(stack, (0.0, 0))
+        _spans[stack] = (total + elapsed, count + 1)
+
+
+class Profiler:
+    def __init__(self, name: str, output_dir: Path = Path("outputs/profiles")) -> None:
+        """性能分析器。同时记录函数级的 profile 与 `span` 标记的各阶段耗时
+
+        安装了 yappi 时使用 yappi 以墙上时间统计, 可以正确统计协程的耗时, 否则使用 cProfile
+
+        Args:
+            name (str): 输出文件名前缀
+            output_dir (Path, optional): 输出目录. Defaults to Path("outputs/profiles").
+        """
+        self.name = name
+        self.output_dir = output_dir
+        self._profile: Optional[cProfile.Profile] = None
+        self._start = 0.0
+
+    def start(self) -> None:
+        global _enabled
+        _spans.clear()
+        _enabled = True
+        self._start = time.perf_counter()
+
+        if yappi is not None:
+            yappi.set_clock_type("wall")
+            yappi.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> Path:
+        """停止性能分析并写出结果
+
+        会写出三个文件:
+        - `.prof`: pstats 格式的函数级 profile, 可使用 snakeviz 等工具查看
+        - `.folded`: 各阶段的折叠栈, 单位为微秒, 可直接交给 flamegraph.pl 或 speedscope 生成火焰图
+        - `.txt`: 各阶段耗时汇总
+
+        Returns:
+            Path: `.folded` 文件路径
+        """
+        global _enabled
+        _enabled = False
+        wall = time.perf_counter() - self._start
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = self.output_dir / f"{self.name}_{int(time.time())}"
+
+        if yappi is not None:
+            yappi.stop()
+            yappi.get_func_stats().save(f"{prefix}.prof", type="pstat")
+            yappi.clear_stats()
+        elif self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(f"{prefix}.prof")
+            self._profile = None
+
+        with open(f"{prefix}.folded", "w", encoding="utf-8") as f:
+            for stack, (total, _) in sorted(_spans.items()):
+                # 火焰图需要的是自身耗时, 即减去子阶段的耗时
+                children = sum(
+                    child_total
+                    for child, (child_total, _) in _spans.items()
+                    if len(child) == len(stack) + 1 and child[: len(stack)] == stack
+                )
+                self_time = max(total - children, 0)
+                f.write(f"{';'.join(stack)} {int(self_time * 1e6)}\n")
+
+        lines = [f"{'stage':<48} {'calls':>8} {'total(s)':>10} {'mean(ms)':>10}"]
+        for stack, (total, count) in sorted(_spans.items()):
+            name = "  " * (len(stack) - 1) + stack[-1]
+            lines.append(
+                f"{name:<48} {count:>8} {total:>10.3f} {total / count * 1000:>10.2f}"
+            )
+        lines.append(f"{'wall clock':<48} {'':>8} {wall:>10.3f}")
+        with open(f"{prefix}.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        log("INFO", "Profile summary:\n" + "\n".join(lines))
+        log(
+            "INFO",
+            f"Profile saved to <c><underline>{Path(f'{prefix}.folded').resolve().as_uri()}</underline></c>",
+        )
+        return Path(f"{prefix}.folded")
@@ -0,0 +1,129 @@
+from itertools import combinations
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Literal, Optional
+
+from .utils import emotion_key
+from .models import Emotion, EmotionAnnotation
+
+INTENSITIES = ["low", "moderate", "high"]
+_intensity_mapping = {"low": 1, "moderate": 2, "high": 3}
+
+
+@dataclass
+class ReferenceMatch:
+    level: Literal["exact", "intensity-relaxed", "type-subset", "default"]
+    annotations: List[EmotionAnnotation]
+
+
+def _score(annotation: EmotionAnnotation, emotions: List[Emotion]) -> int:
+    match_score = 0
+    for target_emotion in emotions:
+        for emotion in annotation.emotions:
+            if emotion.type == target_emotion.type:
+                match_score += abs(
+                    _intensity_mapping[emotion.intensity]
+                    - _intensity_mapping[target_emotion.intensity]
+                )
+                break
+        else:
+            # 如果目标情绪在项目中没有找到，则应用一个大的惩罚
+            match_score += 10
+    return match_score
+
+
+def _best(
+    candidates: List[EmotionAnnotation], emotions: List[Emotion]
+) -> List[EmotionAnnotation]:
+    # 只保留得分最好的一档, 保持原有顺序
+    scores = [_score(a, emotions) for a in candidates]
+    best_score = min(scores)
+    return [a for a, score in zip(candidates, scores) if score == best_score]
+
+
+class ReferenceTable:
+    def __init__(
+        self, annotations: List[EmotionAnnotation], emotion_types: List[str]
+    ) -> None:
+        """参考音频查找表。在加载时为所有单情感与双情感目标预先计算参考音频列表，推理时只需一次字典查询
+
+        匹配依次回退: exact(情感完全一致) -> intensity-relaxed(情感类型一致, 强度最接近)
+        -> type-subset(包含部分目标情感类型, 得分最好) -> default(默认情感的参考音频)
+
+        Args:
+            annotations (List[EmotionAnnotation]): 情感标注列表
+            emotion_types (List[str]): 情感类型列表, 第一个类型的 low 强度为默认情感
+
+        Raises:
+            ValueError: 如果情感标注列表为空
+        """
+        if not annotations:
+            raise ValueError("No emotion annotations to build the reference table")
+
+        self.annotations = annotations
+        self._position = {id(a): i for i, a in enumerate(annotations)}
+        self._by_key: Dict[str, List[EmotionAnnotation]] = {}
+        self._by_types: Dict[FrozenSet[str], List[EmotionAnnotation]] = {}
+        self._by_type: Dict[str, List[EmotionAnnotation]] = {}
+        for annotation in annotations:
+            types = frozenset(e.type for e in annotation.emotions)
+            self._by_key.setdefault(emotion_key(annotation.emotions), []).append(
+                annotation
+            )
+            self._by_types.setdefault(types, []).append(annotation)
+            for emotion_type in types:
+                self._by_type.setdefault(emotion_type, []).append(annotation)
+
+        default = self._match([Emotion(type=emotion_types[0], intensity="low")])
+        if default is not None and default.level != "type-subset":
+            self.default = ReferenceMatch("default", default.annotations)
+        else:
+            self.default = ReferenceMatch("default", [annotations[0]])
+
+        singles = [
+            Emotion(type=t, intensity=i) for t in emotion_types for i in INTENSITIES
+        ]
+        targets = [[e] for e in singles] + [
+            [a, b] for a, b in combinations(singles, 2) if a.type != b.type
+        ]
+        self.table: Dict[str, ReferenceMatch] = {
+            emotion_key(target): self._match(target) or self.default
+            for target in targets
+        }
+
+    def _match(self, emotions: List[Emotion]) -> Optional[ReferenceMatch]:
+        key = emotion_key(emotions)
+        if key in self._by_key:
+            return ReferenceMatch("exact", self._by_key[key])
+
+        types = frozenset(e.type for e in emotions)
+        if types in self._by_types:
+            return ReferenceMatch(
+                "intensity-relaxed", _best(self._by_types[types], emotions)
+            )
+
+        candidates = {
+            id(annotation): annotation
+            for emotion_type in types
+            for annotation in self._by_type.get(emotion_type, [])
+        }
+        if candidates:
+            candidates = sorted(
+                candidates.values(), key=lambda a: self._position[id(a)]
+            )
+            return ReferenceMatch("type-subset", _best(candidates, emotions))
+
+        return None
+
+    def lookup(self, emotions: List[Emotion]) -> ReferenceMatch:
+        """查找目标情感的参考音频, 不在表中的目标(例如三种以上情感)会即时计算
+
+        Args:
+            emotions (List[Emotion]): 目标情感
+
+        Returns:
+            ReferenceMatch: 匹配级别与按优先级排序的参考音频
+        """
+        match = self.table.get(emotion_key(emotions))
+        if match is None:
+            match = self._match(emotions) or self.default
+        return match
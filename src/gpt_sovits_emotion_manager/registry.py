@@ -0,0 +1,225 @@
+import asyncio
+from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .log import log
+from .config import Config
+from .profiling import span
+from .reference import ReferenceTable
+from .classifier import EmotionClassifier
+from .models import Emotion, EmotionAnnotation
+from .workers import WorkerPool, get_worker_pool
+from .utils import load_emotion_annotations
+
+
+class SpeakerIndex:
+    def __init__(
+        self,
+        speaker: str,
+        annotations: List[EmotionAnnotation],
+        config: Config,
+        workers: Optional[WorkerPool] = None,
+    ) -> None:
+        """单个说话人的索引
+
+        Args:
+            speaker (str): 说话人
+            annotations (List[EmotionAnnotation]): 该说话人的情感标注列表
+            config (Config): 配置对象
+            workers (Optional[WorkerPool], optional): 进程池。指定时分类器由 `AnnotationRegistry` 在进程池中训练与运行. Defaults to None.
+        """
+        self.speaker = speaker
+        self.annotations = annotations
+        self.references = ReferenceTable(annotations, config.emotion_types)
+        self.classifier: Optional[EmotionClassifier] = None
+        self.classifier_path: Optional[str] = None
+        self.workers = workers
+
+        if config.classifier.enabled and workers is None:
+            try:
+                self.classifier = EmotionClassifier.fit(
+                    annotations,
+                    ngram_range=(
+                        config.classifier.min_ngram,
+                        config.classifier.max_ngram,
+                    ),
+                    k=config.classifier.k,
+                )
+            except (ImportError, ValueError) as e:
+                log(
+                    "WARNING",
+                    f"Local emotion classifier disabled for <y>{speaker}</y>: {e}",
+                )
+
+    async def classify(self, text: str) -> Optional[Tuple[List[Emotion], float]]:
+        """使用本地分类器预测文本的情感
+
+        Args:
+            text (str): 待分析的文本
+
+        Returns:
+            Optional[Tuple[List[Emotion], float]]: 预测的情感与置信度, 未启用分类器时为 None
+        """
+        if self.classifier is not None:
+            return self.classifier.predict(text)
+        if self.classifier_path is not None:
+            try:
+                return await self.workers.classify(self.classifier_path, text)
+            except FileNotFoundError:
+                # 分类器已被其他进程从缓存目录中清理
+                log(
+                    "WARNING",
+                    f"Local emotion classifier of <y>{self.speaker}</y> was removed from the cache",
+                )
+                self.classifier_path = None
+        return None
+
+
+class AnnotationRegistry:
+    def __init__(
+        self,
+        loaders: Dict[str, Callable[[], List[EmotionAnnotation]]],
+        config: Config,
+    ) -> None:
+        """说话人索引注册表。索引在首次被请求时才加载，超过 `inference.max_speakers` 时淘汰最久未使用的说话人
+
+        Args:
+            loaders (Dict[str, Callable[[], List[EmotionAnnotation]]]): 说话人到情感标注加载函数的映射, 第一个说话人为默认说话人
+            config (Config): 配置对象
+
+        Raises:
+            ValueError: 如果没有任何说话人
+        """
+        if not loaders:
+            raise ValueError("No speaker registered")
+
+        self.config = config
+        self.loaders = loaders
+        self.default_speaker = next(iter(loaders))
+        self._indexes: "OrderedDict[str, SpeakerIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    def from_annotations(
+        cls, annotations: List[EmotionAnnotation], config: Config
+    ) -> "AnnotationRegistry":
+        """从已加载的情感标注创建注册表, 按标注中的 `speaker` 分组
+
+        Args:
+            annotations (List[EmotionAnnotation]): 情感标注列表
+            config (Config): 配置对象
+
+        Returns:
+            AnnotationRegistry: 注册表
+        """
+        groups: Dict[str, List[EmotionAnnotation]] = {}
+        for annotation in annotations:
+            groups.setdefault(annotation.speaker or "default", []).append(annotation)
+
+        return cls(
+            {speaker: (lambda group=group: group) for speaker, group in groups.items()},
+            config,
+        )
+
+    @classmethod
+    def from_files(
+        cls, shards: Dict[str, List[Path]], config: Config
+    ) -> "AnnotationRegistry":
+        """从情感标注文件创建注册表, 文件在说话人首次被请求时才读取
+
+        同一个说话人可以有多个分片文件。如果分片中存在 `speaker` 字段与说话人相同的标注，
+        则只保留这些标注，因此同一个多说话人文件可以被注册到多个说话人下。
+        没有匹配的标注时使用分片中的全部标注, 如果它们来自多个说话人会输出警告
+
+        Args:
+            shards (Dict[str, List[Path]]): 说话人到情感标注文件列表的映射
+            config (Config): 配置对象
+
+        Returns:
+            AnnotationRegistry: 注册表
+        """
+
+        def loader(speaker: str, paths: List[Path]) -> List[EmotionAnnotation]:
+            annotations = []
+            for path in paths:
+                annotations.extend(load_emotion_annotations(path))
+            matched = [a for a in annotations if a.speaker == speaker]
+            if matched:
+                return matched
+
+            speakers = {a.speaker for a in annotations if a.speaker}
+            if len(speakers) > 1:
+                log(
+                    "WARNING",
+                    f"No emotion annotations of <y>{speaker}</y> found, "
+                    f"using all annotations of {len(speakers)} speakers: <y>{', '.join(sorted(speakers))}</y>",
+                )
+            return annotations
+
+        return cls(
+            {
+                speaker: (lambda speaker=speaker, paths=paths: loader(speaker, paths))
+                for speaker, paths in shards.items()
+            },
+            config,
+        )
+
+    @property
+    def speakers(self) -> List[str]:
+        return list(self.loaders)
+
+    async def get(self, speaker: Optional[str] = None) -> SpeakerIndex:
+        """获取说话人索引, 未加载时加载
+
+        Args:
+            speaker (Optional[str], optional): 说话人, 为空时使用默认说话人. Defaults to None.
+
+        Raises:
+            KeyError: 如果说话人未注册
+
+        Returns:
+            SpeakerIndex: 说话人索引
+        """
+        speaker = speaker or self.default_speaker
+        if speaker not in self.loaders:
+            raise KeyError(f"Unknown speaker: {speaker}")
+
+        if speaker in self._indexes:
+            self._indexes.move_to_end(speaker)
+            return self._indexes[speaker]
+
+        lock = self._locks.setdefault(speaker, asyncio.Lock())
+        async with lock:
+            if speaker not in self._indexes:
+                with span("registry.load"):
+                    annotations = await asyncio.to_thread(self.loaders[speaker])
+                if not annotations:
+                    raise ValueError(f"No emotion annotations found for {speaker}")
+                workers = get_worker_pool(self.config)
+                with span("registry.build_index"):
+                    index = await asyncio.to_thread(
+                        SpeakerIndex, speaker, annotations, self.config, workers
+                    )
+                if workers is not None and self.config.classifier.enabled:
+                    try:
+                        index.classifier_path = await workers.fit_classifier(
+                            annotations
+                        )
+                    except (ImportError, ValueError) as e:
+                        log(
+                            "WARNING",
+                            f"Local emotion classifier disabled for <y>{speaker}</y>: {e}",
+                        )
+                self._indexes[speaker] = index
+                log(
+                    "INFO",
+                    f"Loaded <c>{len(annotations)}</c> emotion annotations for <y>{speaker}</y>",
+                )
+
+                while len(self._indexes) > max(1, self.config.inference.max_speakers):
+                    evicted, _ = self._indexes.popitem(last=False)
+                    log("DEBUG", f"Evicted emotion annotations of <y>{evicted}</y>")
+
+            self._indexes.move_to_end(speaker)
+            return self._indexes[speaker]
@@ -0,0 +1,125 @@
+import heapq
+import asyncio
+import itertools
+from enum import IntEnum
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from .log import log
+from .profiling import span
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Scheduler:
+    def __init__(self, max_concurrency: int) -> None:
+        """合成请求调度器
+
+        同时进行的请求不超过 `max_concurrency`，等待中的请求按优先级、截止时间的顺序执行。
+        等待期间已经超过截止时间的请求会被直接丢弃，调用方被取消时正在进行的请求也会被取消
+
+        Args:
+            max_concurrency (int): 同时进行的请求数上限
+        """
+        self.max_concurrency = max_concurrency
+        self._running = 0
+        self._counter = itertools.count()
+        self._waiters: List[Tuple[int, float, int, asyncio.Future]] = []
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    async def run(
+        self,
+        func: Callable[[Optional[float]], Awaitable[T]],
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> T:
+        """在调度器中执行请求
+
+        Args:
+            func (Callable[[Optional[float]], Awaitable[T]]): 请求函数, 参数为开始执行时剩余的时间
+            priority (Priority, optional): 优先级. Defaults to Priority.INTERACTIVE.
+            timeout (Optional[float], optional): 从提交开始计算的超时时间(秒), 为空时不限制. Defaults to None.
+
+        Raises:
+            DeadlineExceeded: 如果请求在开始或完成前超过截止时间
+
+        Returns:
+            T: 请求函数的返回值
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        with span("scheduler.wait"):
+            await self._acquire(priority, deadline)
+        try:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise DeadlineExceeded("Request expired before it started")
+            try:
+                return await asyncio.wait_for(func(remaining), remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request did not finish before its deadline")
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority, deadline: Optional[float]) -> None:
+        if self._running < self.max_concurrency and not self.pending:
+            self._running += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(
+            self._waiters,
+            (
+                priority,
+                deadline if deadline is not None else float("inf"),
+                next(self._counter),
+                future,
+            ),
+        )
+
+        try:
+            await asyncio.wait_for(
+                future, deadline - loop.time() if deadline is not None else None
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request expired while waiting in the queue")
+        except asyncio.CancelledError:
+            # 槽位已经移交给了这个请求, 但请求被取消了, 需要交给下一个请求
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            priority, deadline, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if deadline <= loop.time():
+                log(
+                    "WARNING",
+                    f"Shed a {priority.name.lower()} request past its deadline",
+                )
+                future.set_exception(
+                    DeadlineExceeded("Request expired while waiting in the queue")
+                )
+                continue
+            # 直接将槽位移交给等待中的请求
+            future.set_result(None)
+            return
+        self._running -= 1
@@ -1,15 +1,13 @@
-import re
-import os
 import json
 import asyncio
-from typing import List
 from pathlib import Path
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
 
 from .log import log
 from .config import Config
-from .utils import get_audio_duration
+from .llm import LLMBackend, get_backend
+from .profiling import span
+from .utils import get_audio_duration, iter_batches
 from .models import ListFileAnnotation, EmotionAnnotation, Emotion
 
 
@@ -51,29 +49,58 @@ _prompt = """
 
 
 class Tagger:
-    def __init__(self, config: Config) -> None:
+    def __init__(self, config: Config, backend: Optional[LLMBackend] = None) -> None:
         """初始化情感标注器
 
         Args:
             config (Config): 配置对象
+            backend (Optional[LLMBackend], optional): LLM 后端, 为空时根据配置创建. Defaults to None.
         """
         self.config = config
-        genai.configure(api_key=config.llm.api_key)
-
-        if config.llm.proxy:
-            # 因为 `google.genrativeai` 底层使用 `gRPC` 通信，所以只能通过环境变量设置代理
-            os.environ["HTTP_PROXY"] = config.llm.proxy
-            os.environ["HTTPS_PROXY"] = config.llm.proxy
-
-        self.model = genai.GenerativeModel(
-            model_name=config.llm.model,
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            },
-            generation_config={"max_output_tokens": int(1e6)},
+        self.backend = backend or get_backend(config.llm)
+
+    def iter_list_file(self, list_file_path: str) -> Iterator[ListFileAnnotation]:
+        """逐行读取列表文件中的标注信息, 跳过格式错误的行
+
+        Args:
+            list_file_path (str): 列表文件路径
+
+        Yields:
+            ListFileAnnotation: 标注
+        """
+        with open(list_file_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+
+                annotation = self.parse_line(line)
+                if annotation is None:
+                    log(
+                        "WARNING",
+                        f"Skipped malformed line <c>{list_file_path}:{line_number}</c>: {line}",
+                    )
+                    continue
+
+                yield annotation
+
+    @staticmethod
+    def parse_line(line: str) -> Optional[ListFileAnnotation]:
+        """解析列表文件中的一行
+
+        Args:
+            line (str): 去除首尾空白的行
+
+        Returns:
+            Optional[ListFileAnnotation]: 标注, 格式错误时为 None
+        """
+        fields = line.split("|", 3)
+        if len(fields) != 4:
+            return None
+
+        file, speaker, language, text = fields
+        return ListFileAnnotation(
+            path=file, speaker=speaker, language=language.lower(), text=text
         )
 
     def from_list_file(self, list_file_path: str) -> List[ListFileAnnotation]:
@@ -85,19 +112,7 @@ class Tagger:
         Returns:
             List[ListFileAnnotation]: 标注列表
         """
-        with open(list_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        annotations = []
-        for line in lines:
-            file, speaker, language, text = line.strip().split("|")
-            annotations.append(
-                ListFileAnnotation(
-                    path=file, speaker=speaker, language=language.lower(), text=text
-                )
-            )
-
-        return annotations
+        return list(self.iter_list_file(list_file_path))
 
     def _generate_input(self, list_file_annotation: ListFileAnnotation) -> str:
         if (
@@ -117,21 +132,104 @@ class Tagger:
         return f"({Path(list_file_annotation.path).stem}){list_file_annotation.speaker}: {list_file_annotation.text}"
 
     async def tag(
-        self, list_file_annotation: List[ListFileAnnotation], retry: int = 5
+        self,
+        list_file_annotation: Iterable[ListFileAnnotation],
+        retry: int = 5,
+        progress: Optional[Callable[[int], None]] = None,
     ) -> List[EmotionAnnotation]:
         """进行情感标注
 
         Args:
-            list_file_annotation (List[ListFileAnnotation]): 使用 `from_list_file` 方法生成的标注列表
+            list_file_annotation (Iterable[ListFileAnnotation]): 使用 `from_list_file` 方法生成的标注列表
+            retry (int, optional): 每批的最大重试次数. Defaults to 5.
+            progress (Optional[Callable[[int], None]], optional): 每批完成后以该批的行数调用. Defaults to None.
 
         Returns:
             List[EmotionAnnotation]: 情感标注列表
         """
-        redundancy = 20
+        results = []
+        async for annotations in self.tag_stream(list_file_annotation, retry, progress):
+            results.extend(annotations)
+        return results
+
+    async def tag_stream(
+        self,
+        list_file_annotation: Iterable[ListFileAnnotation],
+        retry: int = 5,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[List[EmotionAnnotation]]:
+        """流式进行情感标注。标注列表会被惰性地分批读取，同时进行中的批次不超过 `llm.max_concurrency`，
+        因此可以直接传入 `iter_list_file` 的结果而无需将整个文件读入内存。
+        先完成的批次会等待前面的批次完成后再输出，因此输出顺序与输入一致
+
+        Args:
+            list_file_annotation (Iterable[ListFileAnnotation]): 标注列表或 `iter_list_file` 生成的迭代器
+            retry (int, optional): 每批的最大重试次数. Defaults to 5.
+            progress (Optional[Callable[[int], None]], optional): 每批完成后以该批的行数调用. Defaults to None.
+
+        Yields:
+            List[EmotionAnnotation]: 按输入顺序输出的去重后的情感标注
+        """
+        max_concurrency = self.config.llm.max_concurrency
+        files = set()
+        # 进行中的批次 -> 批次序号
+        pending: Dict[asyncio.Future, int] = {}
+        # 已完成但前面还有批次未完成的结果, 数量与进行中的批次合计不超过 2 * max_concurrency
+        finished: Dict[int, List[EmotionAnnotation]] = {}
+        started = 0
+        next_index = 0
+        exhausted = False
+
+        batches = iter_batches(list_file_annotation, 200, 20)
+        try:
+            while True:
+                while (
+                    not exhausted
+                    and len(pending) < max_concurrency
+                    and started - next_index < 2 * max_concurrency
+                ):
+                    with span("tagger.read_list"):
+                        batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(
+                        self._process_batch(batch, retry, progress)
+                    )
+                    pending[task] = started
+                    started += 1
+
+                if not pending:
+                    break
 
-        async def process_batch(
-            batch: List[ListFileAnnotation], retry: int
-        ) -> List[EmotionAnnotation]:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    finished[pending.pop(task)] = task.result()
+
+                # 按顺序合并结果并去重
+                result_filtered = []
+                while next_index in finished:
+                    for r in finished.pop(next_index):
+                        if r.file not in files:
+                            files.add(r.file)
+                            result_filtered.append(r)
+                    next_index += 1
+                if result_filtered:
+                    yield result_filtered
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _process_batch(
+        self,
+        batch: List[ListFileAnnotation],
+        retry: int,
+        progress: Optional[Callable[[int], None]],
+    ) -> List[EmotionAnnotation]:
+        # 每批的前 200 行需要标注，其余的是冗余
+        try:
             cnt = 0
             while cnt < retry:
                 try:
@@ -151,69 +249,53 @@ class Tagger:
             ) + "\n".join([self._generate_input(item) for item in batch])
             log("DEBUG", f"Prompt: {prompt}\n")
             return []
-
-        # 分批处理
-        tasks = [
-            process_batch(list_file_annotation[i : i + 200 + redundancy], retry)
-            for i in range(0, len(list_file_annotation), 200)
-        ]
-        # 使用 asyncio.gather 并行运行所有任务
-        all_results = await asyncio.gather(*tasks)
-
-        # 合并结果并去重
-        files = set()
-        result_filtered = []
-        for batch_result in all_results:
-            for r in batch_result:
-                if r.file not in files:
-                    files.add(r.file)
-                    result_filtered.append(r)
-
-        return result_filtered
+        finally:
+            if progress is not None:
+                progress(min(len(batch), 200))
 
     async def _tag(
         self, list_file_annotation: List[ListFileAnnotation]
     ) -> List[EmotionAnnotation]:
-        """使用 Gemini 进行情感标注
+        """使用 LLM 进行情感标注
 
         Args:
             list_file_annotation (List[ListFileAnnotation]): 使用 `from_list_file` 方法生成的标注列表
 
         Raises:
-            ValueError: 如果 Gemini 返回的数据不符合预期
-            json.JSONDecodeError: 如果 Gemini 返回的数据无法解析
+            ValueError: 如果 LLM 返回的数据不符合预期
+            json.JSONDecodeError: 如果 LLM 返回的数据无法解析
 
         Returns:
             List[EmotionAnnotation]: 情感标注列表
         """
-        prompt_ = _prompt.format(emotion_types=", ".join(self.config.emotion_types))
-        prompt = (
-            prompt_
-            + "\n"
-            + "\n".join([self._generate_input(a) for a in list_file_annotation])
-        )
+        with span("tagger.build_prompt"):
+            prompt_ = _prompt.format(emotion_types=", ".join(self.config.emotion_types))
+            prompt = (
+                prompt_
+                + "\n"
+                + "\n".join([self._generate_input(a) for a in list_file_annotation])
+            )
 
         log(
             "INFO",
-            "Requesting Gemini:\n"
+            "Requesting LLM:\n"
             f"<dim>{prompt[len(prompt_): len(prompt_) + 100].strip()}...</dim>",
         )
 
-        result = await self.model.generate_content_async(prompt)
-        text = result.text
-        print("=" * 100)
-        print(text)
-        print("=" * 100)
-        # 这里可能 ValueError，记得在外面处理
-
-        text = re.sub(r"```json|```", "", text).strip()
+        with span("llm.request"):
+            text = await self.backend.generate(prompt, json_mode=True)
+        with span("tagger.debug_print"):
+            print("=" * 100)
+            print(text)
+            print("=" * 100)
 
         annotations = []
-        data = json.loads(text)
+        with span("tagger.parse_json"):
+            data = json.loads(text)
         # 这里可能 json.JSONDecodeError，记得在外面处理
 
         for a in list_file_annotation[:200]:
-            # 留有 20 的冗余，防止 Gemini 返回的数据不完整
+            # 留有 20 的冗余，防止 LLM 返回的数据不完整
             if a.path == "null":
                 continue
 
@@ -242,6 +324,7 @@ class Tagger:
                     text=a.text,
                     language=a.language,
                     emotions=emotions,
+                    speaker=None if a.speaker == "null" else a.speaker,
                 )
             )
         return annotations
@@ -257,4 +340,5 @@ class Tagger:
         Returns:
             List[EmotionAnnotation]: 情感标注列表
         """
-        return [a for a in annotations if 3 <= get_audio_duration(a.file) <= 10]
+        with span("tagger.check_duration"):
+            return [a for a in annotations if 3 <= get_audio_duration(a.file) <= 10]
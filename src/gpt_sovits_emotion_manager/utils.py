@@ -1,8 +1,15 @@
+import json
+import time
 import wave
-from typing import Any, List
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TypeVar
 from dataclasses import asdict, is_dataclass
 
-from .models import Emotion
+from .log import log
+from .models import Emotion, EmotionAnnotation
+
+T = TypeVar("T")
 
 
 def dump_dataclass(obj: Any) -> Any:
@@ -33,3 +40,178 @@ def equal_emotions(emotions: List[Emotion], emotions_: List[Emotion]) -> bool:
 
 def emotion_to_str(emotions: List[Emotion]) -> str:
     return ",".join([f"{emotion.type}:{emotion.intensity}" for emotion in emotions])
+
+
+class Progress:
+    def __init__(self, total: int, unit: str = "lines") -> None:
+        """进度记录器, 每次更新时输出速度与预计剩余时间
+
+        Args:
+            total (int): 总数
+            unit (str, optional): 单位. Defaults to "lines".
+        """
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def update(self, n: int) -> None:
+        self.done += n
+        elapsed = time.perf_counter() - self.start
+        speed = self.done / elapsed if elapsed > 0 else 0
+        eta = (self.total - self.done) / speed if speed > 0 else 0
+        log(
+            "INFO",
+            f"Progress: <c>{self.done}/{self.total}</c> {self.unit} "
+            f"({self.done / max(self.total, 1):.1%}), "
+            f"<c>{speed:.1f}</c> {self.unit}/s, "
+            f"ETA <c>{int(eta) // 60:02d}:{int(eta) % 60:02d}</c>",
+        )
+
+
+def emotion_key(emotions: List[Emotion]) -> str:
+    """将情感列表转换为与顺序无关的字符串, 可用作字典的键"""
+    return emotion_to_str(sorted(emotions, key=lambda x: (x.type, x.intensity)))
+
+
+def derive_seed(*parts: Any) -> int:
+    """根据输入稳定地生成随机种子, 相同的输入在任何进程中都会得到相同的种子"""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") >> 1
+
+
+def str_to_emotions(text: str) -> List[Emotion]:
+    """`emotion_to_str` 的逆操作"""
+    return [
+        Emotion(type=item.split(":")[0], intensity=item.split(":")[1])
+        for item in text.split(",")
+        if item
+    ]
+
+
+def iter_batches(items: Iterable[T], size: int, redundancy: int) -> Iterator[List[T]]:
+    """惰性地将序列切分为批次, 每批附带下一批开头的 `redundancy` 个元素作为冗余
+
+    Args:
+        items (Iterable[T]): 序列
+        size (int): 每批的大小
+        redundancy (int): 冗余的大小
+
+    Yields:
+        List[T]: 批次
+    """
+    buffer = []
+    for item in items:
+        buffer.append(item)
+        if len(buffer) == size + redundancy:
+            yield buffer
+            buffer = buffer[size:]
+    # 剩余的元素可能超过 `size`, 需要继续切分, 保证每个元素都位于某一批的前 `size` 个之中
+    while buffer:
+        yield buffer[: size + redundancy]
+        buffer = buffer[size:]
+
+
+class AnnotationWriter:
+    def __init__(self, file_path: Path) -> None:
+        """以 JSONL 格式逐批写入情感标注, 内存占用与标注总数无关
+
+        Args:
+            file_path (Path): 输出文件路径
+        """
+        self.file_path = file_path
+        self.count = 0
+        self._file = open(file_path, "w", encoding="utf-8")
+
+    def write(self, annotations: List[EmotionAnnotation]) -> None:
+        for annotation in annotations:
+            self._file.write(
+                json.dumps(dump_dataclass(annotation), ensure_ascii=False) + "\n"
+            )
+        self._file.flush()
+        self.count += len(annotations)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "AnnotationWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def iter_jsonl(file_path: Path) -> Iterator[Any]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def jsonl_to_json(jsonl_path: Path, json_path: Path) -> None:
+    """将 JSONL 文件逐行转换为带缩进的 JSON 数组文件
+
+    Args:
+        jsonl_path (Path): JSONL 文件路径
+        json_path (Path): JSON 文件路径
+    """
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        count = 0
+        for item in iter_jsonl(jsonl_path):
+            text = json.dumps(item, ensure_ascii=False, indent=4)
+            f.write(("," if count else "") + "\n    " + text.replace("\n", "\n    "))
+            count += 1
+        f.write("\n]" if count else "]")
+
+
+def load_emotion_annotations(file_path: str) -> List[EmotionAnnotation]:
+    """从情感标注文件中读取情感标注, 支持 JSON 与 JSONL 格式
+
+    Args:
+        file_path (str): 情感标注文件路径
+
+    Returns:
+        List[EmotionAnnotation]: 情感标注列表
+    """
+    if Path(file_path).suffix == ".jsonl":
+        data = iter_jsonl(file_path)
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    return [
+        EmotionAnnotation(
+            emotions=[
+                Emotion(type=emotion["type"], intensity=emotion["intensity"])
+                for emotion in item["emotions"]
+            ],
+            text=item["text"],
+            file=item["file"],
+            language=item["language"],
+            speaker=item.get("speaker"),
+        )
+        for item in data
+    ]
+
+
+def read_speakers(file_path: str) -> List[str]:
+    """读取情感标注文件中出现的说话人, 按首次出现的顺序排列, 不包含没有 `speaker` 字段的标注
+
+    Args:
+        file_path (str): 情感标注文件路径, 支持 JSON 与 JSONL 格式
+
+    Returns:
+        List[str]: 说话人列表
+    """
+    if Path(file_path).suffix == ".jsonl":
+        data = iter_jsonl(file_path)
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    speakers: Dict[str, None] = {}
+    for item in data:
+        if item.get("speaker"):
+            speakers.setdefault(item["speaker"])
+    return list(speakers)
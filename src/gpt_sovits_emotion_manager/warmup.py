@@ -0,0 +1,97 @@
+import time
+import wave
+import asyncio
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from .log import log
+from .inference import Inferer
+from .scheduler import Priority
+from .utils import emotion_key
+from .models import EmotionAnnotation
+
+
+def _check_reference(file_path: str) -> Optional[str]:
+    try:
+        with wave.open(file_path, "rb") as f:
+            if f.getnframes() == 0:
+                return "empty audio"
+            f.readframes(1)
+    except FileNotFoundError:
+        return "file not found"
+    except EOFError:
+        return "truncated audio"
+    except (OSError, wave.Error) as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+async def check_references(
+    annotations: List[EmotionAnnotation], concurrency: int = 32
+) -> Tuple[List[EmotionAnnotation], List[Tuple[EmotionAnnotation, str]]]:
+    """并发检查参考音频是否存在且可读取
+
+    注意：请确保情感标注文件中的路径是本机路径，否则所有参考音频都会被判定为无效
+
+    Args:
+        annotations (List[EmotionAnnotation]): 情感标注列表
+        concurrency (int, optional): 同时检查的文件数量. Defaults to 32.
+
+    Returns:
+        Tuple[List[EmotionAnnotation], List[Tuple[EmotionAnnotation, str]]]: 有效的情感标注, 以及无效的情感标注与原因
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(annotation: EmotionAnnotation) -> Optional[str]:
+        async with semaphore:
+            return await asyncio.to_thread(_check_reference, annotation.file)
+
+    errors = await asyncio.gather(*[check(a) for a in annotations])
+
+    valid = []
+    invalid = []
+    for annotation, error in zip(annotations, errors):
+        if error is None:
+            valid.append(annotation)
+        else:
+            invalid.append((annotation, error))
+    return valid, invalid
+
+
+async def prime_backend(inferer: Inferer, top_n: int) -> None:
+    """使用最常被选中的参考音频预热 GPT-SoVITS/api_v2.py，避免部署后的首批请求加载参考音频
+
+    情感组合在情感标注文件中出现的次数被视为其被请求的频率，每个说话人的每个组合使用其中一条标注的文本与语言进行一次合成
+
+    Args:
+        inferer (Inferer): 推理器
+        top_n (int): 每个说话人预热的情感组合数量
+    """
+    for speaker in inferer.registry.speakers:
+        samples = {}
+        counter = Counter()
+        for annotation in (await inferer.registry.get(speaker)).annotations:
+            if not annotation.emotions:
+                continue
+            key = emotion_key(annotation.emotions)
+            counter[key] += 1
+            samples.setdefault(key, annotation)
+
+        for key, count in counter.most_common(top_n):
+            sample = samples[key]
+            start = time.perf_counter()
+            try:
+                await inferer.generate(
+                    sample.text,
+                    sample.language,
+                    sample.emotions,
+                    speaker,
+                    priority=Priority.BATCH,
+                )
+            except Exception as e:
+                log("WARNING", f"Failed to prime <y>{speaker}</y> <y>{key}</y>", e)
+                continue
+            log(
+                "INFO",
+                f"Primed <y>{speaker}</y> <y>{key}</y> ({count} annotations) in <c>{time.perf_counter() - start:.2f}s</c>",
+            )
@@ -0,0 +1,184 @@
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import multiprocessing
+from pathlib import Path
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from .config import Config
+from .utils import emotion_key
+from .classifier import EmotionClassifier
+from .models import Emotion, EmotionAnnotation
+
+# 每个工作进程中已加载的分类器, 矩阵为内存映射, 多个进程共享同一份物理内存
+_classifiers: "OrderedDict[str, EmotionClassifier]" = OrderedDict()
+_max_classifiers = 8
+
+
+def _init_worker(max_classifiers: int) -> None:
+    global _max_classifiers
+    _max_classifiers = max_classifiers
+
+
+def _fit_classifier(
+    annotations: List[EmotionAnnotation], config: Config, cache_dir: str
+) -> str:
+    digest = hashlib.sha1(
+        repr(
+            (
+                [(a.text, emotion_key(a.emotions)) for a in annotations],
+                config.classifier.min_ngram,
+                config.classifier.max_ngram,
+                config.classifier.k,
+            )
+        ).encode("utf-8")
+    ).hexdigest()
+    directory = Path(cache_dir) / digest
+    if (directory / "meta.json").exists():
+        # 更新修改时间, `_prune` 按修改时间淘汰最久未使用的分类器
+        os.utime(directory)
+        return str(directory)
+
+    classifier = EmotionClassifier.fit(
+        annotations,
+        ngram_range=(config.classifier.min_ngram, config.classifier.max_ngram),
+        k=config.classifier.k,
+    )
+    # 先写入临时目录再重命名, 避免其他进程读到未写完的文件
+    temp_directory = directory.with_name(f"{digest}.{os.getpid()}.tmp")
+    classifier.save(temp_directory)
+    try:
+        temp_directory.rename(directory)
+    except OSError:
+        # 其他进程已经写入了相同的分类器
+        shutil.rmtree(temp_directory, ignore_errors=True)
+    _prune(Path(cache_dir), keep=2 * max(1, config.inference.max_speakers))
+    return str(directory)
+
+
+def _prune(cache_dir: Path, keep: int) -> None:
+    """删除最久未使用的分类器, 只保留最近使用的 `keep` 个
+
+    注册表中同时保留的说话人不超过 `inference.max_speakers`, 保留两倍的数量以免删除其他进程正在使用的分类器。
+    已被内存映射的文件删除后映射仍然有效, 删除失败(例如在 Windows 上)时等待下次清理
+    """
+    directories = []
+    for directory in cache_dir.iterdir():
+        try:
+            if not directory.is_dir():
+                continue
+            mtime = directory.stat().st_mtime
+        except OSError:
+            # 其他进程同时在清理
+            continue
+        if directory.suffix == ".tmp":
+            # 写入中断遗留的临时目录
+            if time.time() - mtime > 3600:
+                shutil.rmtree(directory, ignore_errors=True)
+            continue
+        directories.append((mtime, directory))
+
+    directories.sort(reverse=True)
+    for _, directory in directories[keep:]:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _classify(directory: str, text: str) -> Tuple[List[Emotion], float]:
+    classifier = _classifiers.get(directory)
+    if classifier is None:
+        classifier = _classifiers[directory] = EmotionClassifier.load(Path(directory))
+        while len(_classifiers) > _max_classifiers:
+            _classifiers.popitem(last=False)
+    _classifiers.move_to_end(directory)
+    return classifier.predict(text)
+
+
+class WorkerPool:
+    def __init__(self, config: Config) -> None:
+        """CPU 密集任务的进程池, 避免这些任务阻塞事件循环
+
+        Args:
+            config (Config): 配置对象
+        """
+        self.config = config
+        self.cache_dir = Path(config.workers.cache_dir)
+        self.executor = ProcessPoolExecutor(
+            max_workers=config.workers.processes or os.cpu_count(),
+            # 使用 spawn 以避免在持有事件循环与线程的进程中 fork
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config.inference.max_speakers,),
+        )
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在进程池中运行函数, `func` 与参数必须可以被 pickle
+
+        Args:
+            func (Callable[..., Any]): 函数
+
+        Returns:
+            Any: 函数的返回值
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def fit_classifier(self, annotations: List[EmotionAnnotation]) -> str:
+        """在进程池中训练分类器并保存到缓存目录, 相同的训练数据会复用已保存的分类器
+
+        Args:
+            annotations (List[EmotionAnnotation]): 情感标注列表
+
+        Returns:
+            str: 分类器目录
+        """
+        return await self.run(
+            _fit_classifier, annotations, self.config, str(self.cache_dir)
+        )
+
+    async def classify(self, directory: str, text: str) -> Tuple[List[Emotion], float]:
+        """在进程池中使用分类器预测文本的情感
+
+        Args:
+            directory (str): `fit_classifier` 返回的分类器目录
+            text (str): 待分析的文本
+
+        Returns:
+            Tuple[List[Emotion], float]: 预测的情感与置信度
+        """
+        return await self.run(_classify, directory, text)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[WorkerPool] = None
+
+
+def get_worker_pool(config: Config) -> Optional[WorkerPool]:
+    """获取进程池。未启用 `workers.enabled` 时返回 None, 同一进程内共用一个进程池
+
+    Args:
+        config (Config): 配置对象
+
+    Returns:
+        Optional[WorkerPool]: 进程池
+    """
+    global _pool
+    if not config.workers.enabled:
+        return None
+    if _pool is None:
+        _pool = WorkerPool(config)
+    return _pool
+
+
+def close_worker_pool() -> None:
+    """关闭 `get_worker_pool` 创建的进程池, 未创建时什么也不做"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -0,0 +1,244 @@
+import os
+import shutil
+from pathlib import Path
+from typing import List, Literal, Optional
+
+import pytest
+import yaml
+
+from src.gpt_sovits_emotion_manager.config import (
+    ENV_PREFIX,
+    ConfigError,
+    _apply_env_overrides,
+    _coerce,
+    load_config,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(autouse=True)
+def clean_environ(monkeypatch):
+    for key in list(os.environ):
+        if key.startswith(ENV_PREFIX) or key == "GSEM_CONFIG":
+            monkeypatch.delenv(key)
+
+
+@pytest.fixture
+def config_path(tmp_path) -> Path:
+    path = tmp_path / "config.yaml"
+    shutil.copyfile(ROOT / "config.yaml", path)
+    return path
+
+
+def rewrite(path: Path, **changes) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    for key, value in changes.items():
+        section = data
+        *parents, name = key.split(".")
+        for parent in parents:
+            section = section[parent]
+        if value is ...:
+            del section[name]
+        else:
+            section[name] = value
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+
+
+@pytest.mark.parametrize(
+    "value, tp, expected",
+    [
+        ("8", int, 8),
+        (8.0, int, 8),
+        ("0.5", float, 0.5),
+        (3, float, 3.0),
+        ("yes", bool, True),
+        ("Off", bool, False),
+        ("1", bool, True),
+        (12, str, "12"),
+        ("Info", Literal["DEBUG", "INFO"], "INFO"),
+        (None, Optional[str], None),
+        ("null", Optional[str], None),
+        ("~", Optional[int], None),
+        ("20", Optional[int], 20),
+        ("[joy, fear]", List[str], ["joy", "fear"]),
+        (["joy"], List[str], ["joy"]),
+    ],
+)
+def test_coerce(value, tp, expected):
+    result = _coerce(value, tp, "key")
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize(
+    "value, tp",
+    [
+        ("eight", int),
+        (1.5, int),
+        (True, int),
+        ("maybe", bool),
+        (None, str),
+        (["a"], str),
+        ("trace", Literal["DEBUG", "INFO"]),
+        ("joy", List[int]),
+        ("nope", Optional[int]),
+    ],
+)
+def test_coerce_rejects_invalid_values(value, tp):
+    with pytest.raises(ConfigError, match="`key"):
+        _coerce(value, tp, "key")
+
+
+def test_load_config(config_path):
+    config = load_config(str(config_path), use_cache=False)
+    assert config.log_level == "INFO"
+    assert config.inference.top_k == 15
+    assert config.emotion_types[0] == "joy"
+
+
+def test_load_config_from_environ(config_path, monkeypatch):
+    monkeypatch.setenv("GSEM_CONFIG", str(config_path))
+    assert load_config(use_cache=False).inference.top_k == 15
+
+
+def test_missing_config_file(tmp_path):
+    with pytest.raises(ConfigError, match="not found"):
+        load_config(str(tmp_path / "missing.yaml"))
+
+
+def test_unknown_key(config_path):
+    rewrite(config_path, **{"inference.topk": 3})
+    with pytest.raises(ConfigError, match="Unknown config `inference.topk`"):
+        load_config(str(config_path), use_cache=False)
+
+
+def test_missing_key(config_path):
+    rewrite(config_path, **{"inference.top_k": ...})
+    with pytest.raises(ConfigError, match="Missing config `inference.top_k`"):
+        load_config(str(config_path), use_cache=False)
+
+
+def test_missing_key_with_default(config_path):
+    rewrite(config_path, **{"inference.max_speakers": ..., "classifier": ...})
+    config = load_config(str(config_path), use_cache=False)
+    assert config.inference.max_speakers == 8
+    assert config.classifier.enabled is False
+
+
+def test_env_overrides(config_path, monkeypatch):
+    monkeypatch.setenv("GSEM__INFERENCE__TOP_K", "20")
+    monkeypatch.setenv("GSEM__INFERENCE__USE_AUX_REF", "false")
+    monkeypatch.setenv("GSEM__LLM__API_KEY", "0123")
+    monkeypatch.setenv("GSEM__LLM__PROXY", "null")
+    monkeypatch.setenv("GSEM__LOG_LEVEL", "debug")
+    monkeypatch.setenv("GSEM__EMOTION_TYPES", "[joy, fear]")
+
+    config = load_config(str(config_path), use_cache=False)
+    assert config.inference.top_k == 20
+    assert config.inference.use_aux_ref is False
+    # 环境变量按字段类型转换, 不会被当作 YAML 解析成数字
+    assert config.llm.api_key == "0123"
+    assert config.llm.proxy is None
+    assert config.log_level == "DEBUG"
+    assert config.emotion_types == ["joy", "fear"]
+
+
+def test_env_override_creates_missing_section(config_path, monkeypatch):
+    rewrite(config_path, classifier=...)
+    monkeypatch.setenv("GSEM__CLASSIFIER__K", "3")
+    assert load_config(str(config_path), use_cache=False).classifier.k == 3
+
+
+def test_env_override_unknown_key(config_path, monkeypatch):
+    monkeypatch.setenv("GSEM__LLM__API_KEYS", "xxx")
+    with pytest.raises(ConfigError, match="Unknown config `llm.api_keys`"):
+        load_config(str(config_path), use_cache=False)
+
+
+def test_env_override_invalid_value(config_path, monkeypatch):
+    monkeypatch.setenv("GSEM__INFERENCE__TOP_K", "many")
+    with pytest.raises(ConfigError, match="`inference.top_k` should be a number"):
+        load_config(str(config_path), use_cache=False)
+
+
+def test_env_override_under_scalar():
+    data = {"log_level": "info"}
+    with pytest.raises(ConfigError, match="`log_level`"):
+        _apply_env_overrides(data, {"GSEM__LOG_LEVEL__X": "1"})
+
+
+@pytest.mark.parametrize(
+    "key, value, message",
+    [
+        ("GSEM__INFERENCE__TIMEOUT", "nan", "inference.timeout"),
+        ("GSEM__LLM__TIMEOUT", "0", "llm.timeout"),
+        ("GSEM__CLASSIFIER__THRESHOLD", "1.5", "classifier.threshold"),
+        ("GSEM__CLASSIFIER__MIN_NGRAM", "0", "min_ngram"),
+        ("GSEM__CLASSIFIER__MIN_NGRAM", "4", "min_ngram"),
+        ("GSEM__INFERENCE__TOP_K", "0", "inference.top_k"),
+        ("GSEM__WORKERS__PROCESSES", "-1", "workers.processes"),
+        ("GSEM__EMOTION_TYPES", "[joy, joy]", "duplicates"),
+        ("GSEM__LLM__PROVIDER", "openai", "llm.base_url"),
+    ],
+)
+def test_validation(config_path, monkeypatch, key, value, message):
+    monkeypatch.setenv(key, value)
+    with pytest.raises(ConfigError, match=message):
+        load_config(str(config_path), use_cache=False)
+
+
+def cache_file(config_path: Path) -> Path:
+    return config_path.parent / ".cache" / "config.pickle"
+
+
+def test_cache_is_reused(config_path):
+    load_config(str(config_path))
+    assert cache_file(config_path).exists()
+
+    # 缓存命中时不再读取配置文件
+    stat = config_path.stat()
+    with open(config_path, "r+", encoding="utf-8") as f:
+        content = f.read()
+        f.seek(0)
+        f.write(content.replace("top_k: 15", "top_k: 16"))
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert load_config(str(config_path)).inference.top_k == 15
+    assert load_config(str(config_path), use_cache=False).inference.top_k == 16
+
+
+def test_cache_invalidated_on_change(config_path):
+    assert load_config(str(config_path)).inference.top_k == 15
+
+    stat = config_path.stat()
+    rewrite(config_path, **{"inference.top_k": 30})
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert load_config(str(config_path)).inference.top_k == 30
+
+
+def test_cache_applies_current_env_overrides(config_path, monkeypatch):
+    monkeypatch.setenv("GSEM__LLM__API_KEY", "first-secret")
+    assert load_config(str(config_path)).llm.api_key == "first-secret"
+
+    monkeypatch.setenv("GSEM__LLM__API_KEY", "second-secret")
+    assert load_config(str(config_path)).llm.api_key == "second-secret"
+
+    monkeypatch.delenv("GSEM__LLM__API_KEY")
+    assert load_config(str(config_path)).llm.api_key == "your_api_key"
+
+
+def test_cache_does_not_store_env_overrides(config_path, monkeypatch):
+    monkeypatch.setenv("GSEM__LLM__API_KEY", "super-secret")
+    load_config(str(config_path))
+    assert b"super-secret" not in cache_file(config_path).read_bytes()
+
+
+def test_corrupted_cache_is_ignored(config_path):
+    cache = cache_file(config_path)
+    cache.parent.mkdir()
+    cache.write_bytes(b"not a pickle")
+    assert load_config(str(config_path)).inference.top_k == 15
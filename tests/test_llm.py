@@ -0,0 +1,49 @@
+import asyncio
+import dataclasses
+from pathlib import Path
+
+from src.gpt_sovits_emotion_manager.config import load_config
+from src.gpt_sovits_emotion_manager.llm import _backends, close_backends, get_backend
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_config(**changes):
+    config = load_config(str(ROOT / "config.yaml"), use_cache=False).llm
+    return dataclasses.replace(
+        config, provider="openai", base_url="http://127.0.0.1:8000/v1", **changes
+    )
+
+
+def test_get_backend_reuses_backend_per_config():
+    async def main():
+        try:
+            backend = get_backend(make_config())
+            assert get_backend(make_config()) is backend
+            for changes in [
+                {"proxy": None},
+                {"max_concurrency": 2},
+                {"requests_per_minute": 60},
+                {"timeout": 5},
+            ]:
+                assert get_backend(make_config(**changes)) is not backend
+            assert len(_backends) == 5
+        finally:
+            await close_backends()
+
+    asyncio.run(main())
+
+
+def test_close_backends():
+    async def main():
+        backend = get_backend(make_config())
+        await close_backends()
+        assert backend.client.is_closed
+        assert not _backends
+        # 关闭后重新创建新的后端
+        assert get_backend(make_config()) is not backend
+        await close_backends()
+        # 没有后端时什么也不做
+        await close_backends()
+
+    asyncio.run(main())
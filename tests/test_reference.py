@@ -0,0 +1,110 @@
+import pytest
+
+from src.gpt_sovits_emotion_manager.models import EmotionAnnotation
+from src.gpt_sovits_emotion_manager.reference import ReferenceTable
+from src.gpt_sovits_emotion_manager.utils import str_to_emotions
+
+EMOTION_TYPES = ["joy", "fear", "sadness", "anger"]
+
+
+def annotation(file: str, emotions: str) -> EmotionAnnotation:
+    return EmotionAnnotation(
+        file=file, text=file, language="zh", emotions=str_to_emotions(emotions)
+    )
+
+
+ANNOTATIONS = [
+    annotation("joy_low_1", "joy:low"),
+    annotation("joy_moderate", "joy:moderate"),
+    annotation("joy_low_2", "joy:low"),
+    annotation("fear_moderate", "fear:moderate"),
+    annotation("joy_fear", "joy:high,fear:low"),
+    annotation("sadness_high", "sadness:high"),
+]
+
+
+@pytest.fixture
+def table() -> ReferenceTable:
+    return ReferenceTable(ANNOTATIONS, EMOTION_TYPES)
+
+
+def files(match):
+    return [a.file for a in match.annotations]
+
+
+def test_exact(table):
+    match = table.lookup(str_to_emotions("joy:low"))
+    assert match.level == "exact"
+    assert files(match) == ["joy_low_1", "joy_low_2"]
+
+
+def test_exact_ignores_emotion_order(table):
+    match = table.lookup(str_to_emotions("fear:low,joy:high"))
+    assert match.level == "exact"
+    assert files(match) == ["joy_fear"]
+
+
+def test_intensity_relaxed(table):
+    match = table.lookup(str_to_emotions("joy:high"))
+    assert match.level == "intensity-relaxed"
+    # 只保留强度最接近的一档
+    assert files(match) == ["joy_moderate"]
+
+
+def test_intensity_relaxed_multiple_emotions(table):
+    match = table.lookup(str_to_emotions("joy:low,fear:high"))
+    assert match.level == "intensity-relaxed"
+    assert files(match) == ["joy_fear"]
+
+
+def test_type_subset(table):
+    match = table.lookup(str_to_emotions("sadness:low,anger:high"))
+    assert match.level == "type-subset"
+    assert files(match) == ["sadness_high"]
+
+
+def test_type_subset_keeps_best_score_in_original_order(table):
+    match = table.lookup(str_to_emotions("joy:low,anger:low"))
+    assert match.level == "type-subset"
+    assert files(match) == ["joy_low_1", "joy_low_2"]
+
+
+def test_default(table):
+    match = table.lookup(str_to_emotions("anger:moderate"))
+    assert match.level == "default"
+    assert files(match) == ["joy_low_1", "joy_low_2"]
+
+
+def test_default_without_first_emotion_type():
+    table = ReferenceTable(
+        [annotation("fear", "fear:low"), annotation("anger", "anger:high")],
+        EMOTION_TYPES,
+    )
+    match = table.lookup(str_to_emotions("sadness:low"))
+    assert match.level == "default"
+    assert files(match) == ["fear"]
+
+
+def test_lookup_outside_precomputed_table(table):
+    emotions = str_to_emotions("joy:low,fear:low,sadness:low")
+    assert table.table.get("fear:low,joy:low,sadness:low") is None
+    match = table.lookup(emotions)
+    assert match.level == "type-subset"
+    assert files(match) == ["joy_fear"]
+
+
+def test_table_covers_single_and_pair_targets(table):
+    # 4 种类型 x 3 种强度的单情感, 以及不同类型两两组合的双情感
+    assert len(table.table) == 12 + (12 * 9) // 2
+    for match in table.table.values():
+        assert match.annotations
+
+
+def test_empty_annotations():
+    with pytest.raises(ValueError):
+        ReferenceTable([], EMOTION_TYPES)
+
+
+def test_lookup_matches_precomputed_table(table):
+    for key, match in table.table.items():
+        assert table.lookup(str_to_emotions(key)) is match
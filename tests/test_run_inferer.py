@@ -0,0 +1,76 @@
+import json
+import asyncio
+from pathlib import Path
+
+from run_inferer import parse_shards
+from src.gpt_sovits_emotion_manager.config import load_config
+from src.gpt_sovits_emotion_manager.registry import AnnotationRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_parse_shards():
+    assert parse_shards(
+        [
+            "alice=/data/run=1/a.json",
+            "alice=b.jsonl",
+            "/data/run=1/bob_emotion_annotation.json",
+            "carol.json",
+        ]
+    ) == {
+        "alice": [Path("/data/run=1/a.json"), Path("b.jsonl")],
+        "bob": [Path("/data/run=1/bob_emotion_annotation.json")],
+        "carol": [Path("carol.json")],
+    }
+
+
+def test_parse_shards_without_speaker_prefix():
+    # `=` 前包含路径分隔符或为空时, 整个参数都是路径
+    assert parse_shards(["./x=1/a.json", "=a.json"]) == {
+        "a": [Path("./x=1/a.json")],
+        "=a": [Path("=a.json")],
+    }
+
+
+def write_annotations(path: Path, speakers) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for i, speaker in enumerate(speakers):
+            annotation = {
+                "file": f"{i}.wav",
+                "text": f"文本{i}",
+                "language": "zh",
+                "emotions": [{"type": "joy", "intensity": "low"}],
+                "speaker": speaker,
+            }
+            f.write(json.dumps(annotation, ensure_ascii=False) + "\n")
+
+
+def test_parse_shards_splits_multi_speaker_file(tmp_path):
+    path = tmp_path / "out_emotion_annotation.jsonl"
+    write_annotations(path, ["bob", "alice", "bob", None])
+    assert parse_shards([str(path)]) == {"bob": [path], "alice": [path]}
+
+
+def test_parse_shards_single_speaker_file_uses_stem(tmp_path):
+    path = tmp_path / "out_emotion_annotation.jsonl"
+    write_annotations(path, ["bob", None])
+    assert parse_shards([str(path)]) == {"out": [path]}
+    # 指定了说话人时不拆分
+    multi = tmp_path / "multi.jsonl"
+    write_annotations(multi, ["bob", "alice"])
+    assert parse_shards([f"carol={multi}"]) == {"carol": [multi]}
+
+
+def test_multi_speaker_file_routes_by_speaker(tmp_path):
+    path = tmp_path / "out_emotion_annotation.jsonl"
+    write_annotations(path, ["bob", "alice", "bob"])
+    config = load_config(str(ROOT / "config.yaml"), use_cache=False)
+    registry = AnnotationRegistry.from_files(parse_shards([str(path)]), config)
+
+    async def main():
+        return {
+            speaker: [a.file for a in (await registry.get(speaker)).annotations]
+            for speaker in registry.speakers
+        }
+
+    assert asyncio.run(main()) == {"bob": ["0.wav", "2.wav"], "alice": ["1.wav"]}
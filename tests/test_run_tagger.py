@@ -0,0 +1,26 @@
+from pathlib import Path
+
+import pytest
+
+from run_tagger import output_paths
+
+
+def test_output_paths():
+    assert output_paths([Path("lists/a.list"), Path("lists/b.list")]) == {
+        Path("lists/a.list"): Path("outputs/emotions/a_emotion_annotation.jsonl"),
+        Path("lists/b.list"): Path("outputs/emotions/b_emotion_annotation.jsonl"),
+    }
+
+
+def test_output_paths_prefixes_colliding_stems():
+    paths = output_paths([Path("a/spk.list"), Path("b/spk.list"), Path("c/x.list")])
+    assert paths == {
+        Path("a/spk.list"): Path("outputs/emotions/a_spk_emotion_annotation.jsonl"),
+        Path("b/spk.list"): Path("outputs/emotions/b_spk_emotion_annotation.jsonl"),
+        Path("c/x.list"): Path("outputs/emotions/x_emotion_annotation.jsonl"),
+    }
+
+
+def test_output_paths_rejects_unresolvable_collisions():
+    with pytest.raises(ValueError):
+        output_paths([Path("a/x/spk.list"), Path("b/x/spk.list")])
@@ -0,0 +1,243 @@
+import asyncio
+
+import pytest
+
+from src.gpt_sovits_emotion_manager.scheduler import (
+    DeadlineExceeded,
+    Priority,
+    Scheduler,
+)
+
+
+def assert_idle(scheduler: Scheduler) -> None:
+    # 所有请求结束后不应泄漏槽位或等待者
+    assert scheduler._running == 0
+    assert scheduler.pending == 0
+
+
+async def hold(scheduler: Scheduler, release: asyncio.Event) -> asyncio.Task:
+    """占用一个槽位直到 `release` 被设置"""
+
+    async def func(remaining):
+        await release.wait()
+
+    task = asyncio.ensure_future(scheduler.run(func))
+    await asyncio.sleep(0)
+    assert scheduler._running == 1
+    return task
+
+
+def test_runs_waiters_by_priority_then_deadline():
+    async def main():
+        scheduler = Scheduler(1)
+        release = asyncio.Event()
+        holder = await hold(scheduler, release)
+
+        order = []
+
+        def record(name):
+            async def func(remaining):
+                order.append(name)
+
+            return func
+
+        tasks = [
+            asyncio.ensure_future(scheduler.run(record("batch"), Priority.BATCH)),
+            asyncio.ensure_future(
+                scheduler.run(record("interactive-late"), Priority.INTERACTIVE, 60)
+            ),
+            asyncio.ensure_future(
+                scheduler.run(record("interactive-early"), Priority.INTERACTIVE, 30)
+            ),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.pending == 3
+
+        release.set()
+        await asyncio.gather(holder, *tasks)
+
+        assert order == ["interactive-early", "interactive-late", "batch"]
+        assert_idle(scheduler)
+
+    asyncio.run(main())
+
+
+def test_passes_remaining_time_to_func():
+    async def main():
+        scheduler = Scheduler(1)
+
+        async def func(remaining):
+            return remaining
+
+        assert await scheduler.run(func) is None
+        remaining = await scheduler.run(func, timeout=10)
+        assert 0 < remaining <= 10
+        assert_idle(scheduler)
+
+    asyncio.run(main())
+
+
+def test_sheds_waiters_past_their_deadline():
+    async def main():
+        scheduler = Scheduler(1)
+        release = asyncio.Event()
+        holder = await hold(scheduler, release)
+
+        called = False
+
+        async def func(remaining):
+            nonlocal called
+            called = True
+
+        with pytest.raises(DeadlineExceeded):
+            await scheduler.run(func, Priority.BATCH, timeout=0.05)
+        assert not called
+
+        release.set()
+        await holder
+        assert_idle(scheduler)
+
+    asyncio.run(main())
+
+
+def test_sheds_expired_waiters_on_release():
+    async def main():
+        scheduler = Scheduler(1)
+        loop = asyncio.get_running_loop()
+
+        async def slow(remaining):
+            # 阻塞事件循环, 让等待者在被唤醒前就已超过截止时间
+            await asyncio.sleep(0)
+            deadline = loop.time() + 0.05
+            while loop.time() < deadline:
+                pass
+
+        async def func(remaining):
+            return "ran"
+
+        holder = asyncio.ensure_future(scheduler.run(slow))
+        expired = asyncio.ensure_future(scheduler.run(func, timeout=0.01))
+        waiting = asyncio.ensure_future(scheduler.run(func))
+
+        results = await asyncio.gather(holder, expired, waiting, return_exceptions=True)
+        assert isinstance(results[1], DeadlineExceeded)
+        assert results[2] == "ran"
+        assert_idle(scheduler)
+
+    asyncio.run(main())
+
+
+def test_raises_when_request_runs_past_deadline():
+    async def main():
+        scheduler = Scheduler(1)
+
+        async def func(remaining):
+            await asyncio.sleep(1)
+
+        with pytest.raises(DeadlineExceeded):
+            await scheduler.run(func, timeout=0.05)
+        assert_idle(scheduler)
+
+    asyncio.run(main())
+
+
+def test_cancelling_running_request_releases_slot():
+    async def main():
+        scheduler = Scheduler(1)
+        started = asyncio.Event()
+        cancelled = False
+
+        async def func(remaining):
+            nonlocal cancelled
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+        async def quick(remaining):
+            return "ran"
+
+        task = asyncio.ensure_future(scheduler.run(func))
+        waiter = asyncio.ensure_future(scheduler.run(quick))
+        await started.wait()
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert cancelled
+        assert await waiter == "ran"
+        assert_idle(scheduler)
+
+    asyncio.run(main())
+
+
+def test_cancelling_waiter_does_not_leak():
+    async def main():
+        scheduler = Scheduler(1)
+        release = asyncio.Event()
+        holder = await hold(scheduler, release)
+
+        async def func(remaining):
+            return "ran"
+
+        waiter = asyncio.ensure_future(scheduler.run(func))
+        await asyncio.sleep(0)
+        assert scheduler.pending == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.pending == 0
+
+        release.set()
+        await holder
+        assert_idle(scheduler)
+        assert await scheduler.run(func) == "ran"
+
+    asyncio.run(main())
+
+
+def test_cancelling_waiter_during_handoff_does_not_leak():
+    async def main():
+        scheduler = Scheduler(1)
+        waiter = None
+
+        async def holder_func(remaining):
+            await asyncio.sleep(0)
+            # 在槽位移交给等待者之后、等待者恢复执行之前取消它
+            asyncio.get_running_loop().call_soon(waiter.cancel)
+
+        async def func(remaining):
+            return "ran"
+
+        holder = asyncio.ensure_future(scheduler.run(holder_func))
+        waiter = asyncio.ensure_future(scheduler.run(func))
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+
+        assert waiter.cancelled()
+        assert_idle(scheduler)
+        assert await scheduler.run(func) == "ran"
+
+    asyncio.run(main())
+
+
+def test_limits_concurrency():
+    async def main():
+        scheduler = Scheduler(2)
+        running = 0
+        peak = 0
+
+        async def func(remaining):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*[scheduler.run(func) for _ in range(6)])
+        assert peak == 2
+        assert_idle(scheduler)
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import re
+import json
+import random
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from src.gpt_sovits_emotion_manager import Tagger
+from src.gpt_sovits_emotion_manager.config import load_config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class FakeBackend:
+    """为提示词中的每个标识符返回 joy:low, 并随机延迟以打乱批次的完成顺序"""
+
+    def __init__(self, seed: int = 0) -> None:
+        self.random = random.Random(seed)
+        self.running = 0
+        self.peak = 0
+
+    async def generate(self, prompt: str, json_mode: bool = False) -> str:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.random.uniform(0, 0.02))
+        finally:
+            self.running -= 1
+        stems = re.findall(r"^\((.+?)\)", prompt.split("文本：", 1)[1], re.M)
+        return json.dumps(
+            {stem: [{"type": "joy", "intensity": "low"}] for stem in stems}
+        )
+
+    async def aclose(self) -> None:
+        pass
+
+
+def make_tagger(backend: FakeBackend, max_concurrency: int = 4) -> Tagger:
+    config = load_config(str(ROOT / "config.yaml"), use_cache=False)
+    config.llm.max_concurrency = max_concurrency
+    return Tagger(config, backend=backend)
+
+
+def write_list(path: Path, count: int, malformed: int = 0) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(f"/data/{i}.wav|alice|ZH|文本{i}\n")
+            if i < malformed:
+                f.write("malformed line\n\n")
+
+
+def test_parse_line():
+    annotation = Tagger.parse_line("/data/a.wav|alice|ZH|你好|世界")
+    assert annotation.path == "/data/a.wav"
+    assert annotation.speaker == "alice"
+    assert annotation.language == "zh"
+    assert annotation.text == "你好|世界"
+    assert Tagger.parse_line("/data/a.wav|alice|ZH") is None
+
+
+def test_iter_list_file_skips_malformed_lines(tmp_path):
+    path = tmp_path / "a.list"
+    write_list(path, 5, malformed=2)
+    tagger = make_tagger(FakeBackend())
+    assert [a.path for a in tagger.iter_list_file(path)] == [
+        f"/data/{i}.wav" for i in range(5)
+    ]
+
+
+@pytest.mark.parametrize("count", [1, 200, 210, 219, 220, 415, 2050])
+def test_tag_stream_tags_every_line_in_input_order(tmp_path, count):
+    path = tmp_path / "a.list"
+    write_list(path, count, malformed=3)
+    backend = FakeBackend()
+    tagger = make_tagger(backend)
+    progress = []
+
+    async def main():
+        results = []
+        async for annotations in tagger.tag_stream(
+            tagger.iter_list_file(path), progress=progress.append
+        ):
+            results.extend(annotations)
+        return results
+
+    results = asyncio.run(main())
+    assert [a.file for a in results] == [f"/data/{i}.wav" for i in range(count)]
+    assert all(a.speaker == "alice" for a in results)
+    # 进度总数与有效行数一致
+    assert sum(progress) == count
+    assert backend.peak == min(4, -(-count // 200))
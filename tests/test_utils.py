@@ -0,0 +1,20 @@
+import pytest
+
+from src.gpt_sovits_emotion_manager.utils import iter_batches
+
+
+@pytest.mark.parametrize("count", [0, 1, 199, 200, 201, 210, 219, 220, 221, 400, 415])
+def test_iter_batches_matches_slicing(count):
+    items = list(range(count))
+    assert list(iter_batches(iter(items), 200, 20)) == [
+        items[i : i + 220] for i in range(0, count, 200)
+    ]
+
+
+@pytest.mark.parametrize("count", [210, 415, 1019])
+def test_iter_batches_covers_every_item(count):
+    # 每个元素都必须位于某一批的前 `size` 个之中, 冗余部分不会被标注
+    covered = [
+        item for batch in iter_batches(range(count), 200, 20) for item in batch[:200]
+    ]
+    assert covered == list(range(count))
@@ -0,0 +1,76 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from pathlib import Path
+
+from src.gpt_sovits_emotion_manager.config import load_config
+from src.gpt_sovits_emotion_manager.models import EmotionAnnotation
+from src.gpt_sovits_emotion_manager.utils import str_to_emotions
+from src.gpt_sovits_emotion_manager.workers import _fit_classifier
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def annotations(prefix: str):
+    return [
+        EmotionAnnotation(
+            file=f"{prefix}{i}.wav",
+            text=f"{prefix}文本{i}",
+            language="zh",
+            emotions=str_to_emotions("joy:low" if i % 2 else "fear:high"),
+        )
+        for i in range(4)
+    ]
+
+
+@pytest.fixture
+def config():
+    config = load_config(str(ROOT / "config.yaml"), use_cache=False)
+    config.inference.max_speakers = 1
+    return config
+
+
+def fit(prefix, config, cache_dir) -> Path:
+    # 将已有分类器的修改时间提前, 模拟它们在更早之前被使用
+    for directory in Path(cache_dir).iterdir():
+        mtime = directory.stat().st_mtime - 10
+        os.utime(directory, (mtime, mtime))
+    return Path(_fit_classifier(annotations(prefix), config, str(cache_dir)))
+
+
+def test_fit_reuses_cached_classifier(config, tmp_path):
+    first = _fit_classifier(annotations("a"), config, str(tmp_path))
+    assert _fit_classifier(annotations("a"), config, str(tmp_path)) == first
+    assert (Path(first) / "meta.json").exists()
+
+
+def test_prunes_least_recently_used_classifiers(config, tmp_path):
+    # 只保留 2 * max_speakers 个分类器
+    a = fit("a", config, tmp_path)
+    b = fit("b", config, tmp_path)
+    c = fit("c", config, tmp_path)
+    assert not a.exists()
+    assert b.exists() and c.exists()
+
+    # 再次使用的分类器不会被淘汰
+    assert fit("b", config, tmp_path) == b
+    fit("d", config, tmp_path)
+    assert b.exists()
+    assert not c.exists()
+
+
+def test_prunes_stale_temporary_directories(config, tmp_path):
+    stale = tmp_path / "digest.123.tmp"
+    fresh = tmp_path / "digest.456.tmp"
+    stale.mkdir()
+    fresh.mkdir()
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+    _fit_classifier(annotations("a"), config, str(tmp_path))
+    assert not stale.exists()
+    assert fresh.exists()